@@ -0,0 +1,144 @@
+# Module sending kill announcements from each game's outbox, coalescing bursts and pacing every channel
+import asyncio
+
+import discord
+
+from games import current_game, game_router, playing
+from logger import error
+
+# Discord rejects longer messages
+MAX_MESSAGE_LENGTH = 2000
+
+def _coalesce(rows: list[tuple[int, int, str]]) -> list[tuple[int, list[int], str]]:
+    """Joins outbox rows into as few messages per channel as fit, keeping their order.
+
+    Returns:
+        (channel id, outbox ids, content) of every message to send
+    """
+    messages: list[tuple[int, list[int], str]] = []
+    open_messages: dict[int, int] = {}
+    for announcement_id, channel_id, content in rows:
+        content = content[:MAX_MESSAGE_LENGTH]
+        index = open_messages.get(channel_id)
+        if index is not None and len(messages[index][2]) + 1 + len(content) <= MAX_MESSAGE_LENGTH:
+            _, ids, joined = messages[index]
+            ids.append(announcement_id)
+            messages[index] = (channel_id, ids, f"{joined}\n{content}")
+        else:
+            open_messages[channel_id] = len(messages)
+            messages.append((channel_id, [announcement_id], content))
+    return messages
+
+
+class KillAnnouncer:
+    """Delivers kill announcements in the background so commands don't wait on discord.
+
+    Kills add their message to the game's `announcement_outbox` in their own transaction
+    (see `database.eliminate_player`) and `notify` the announcer. Once the first message
+    of a burst is queued, the announcer waits `batch_window` seconds, joins
+    everything queued per channel into as few messages as fit, sends at most one
+    message per channel every `min_interval` seconds and deletes what was sent from the
+    outbox. Messages that can't be sent yet stay queued and are retried with exponential
+    backoff, also after a restart. A crash between sending and deleting repeats a message
+    rather than losing it.
+    """
+    def __init__(self, batch_window: float = 1.0, min_interval: float = 1.0, max_backoff: float = 60.0, batch_size: int = 100):
+        self.batch_window = batch_window
+        self.min_interval = min_interval
+        self.max_backoff = max_backoff
+        self.batch_size = batch_size
+        self.bot: discord.Bot | None = None
+        # Names of games whose outbox may hold messages
+        self._pending: set[str] = set()
+        self._wake = asyncio.Event()
+        self._next_send: dict[int, float] = {}
+        self._backoff: dict[str, float] = {}
+        self._task: asyncio.Task | None = None
+
+    def kill_channel_id(self, fallback_channel_id: int | None = None) -> int:
+        """Returns the channel the current game's kills are announced in.
+
+        Args:
+            fallback_channel_id: channel to use instead if the kill channel can't be found
+        """
+        channel_id = current_game().kill_channel_id
+        if self.bot is not None and fallback_channel_id is not None and self.bot.get_channel(channel_id) is None:
+            return fallback_channel_id
+        return channel_id
+
+    def notify(self, game_name: str):
+        """Marks a game's outbox as having messages to send."""
+        self._pending.add(game_name)
+        self._wake.set()
+
+    def start(self, bot: discord.Bot) -> asyncio.Task:
+        """Starts sending announcements through `bot`, beginning with whatever was left in any game's outbox."""
+        self.bot = bot
+        for game_name in game_router.active_game_names():
+            self.notify(game_name)
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        return self._task
+
+    async def _run(self):
+        while True:
+            await self._wake.wait()
+            # Let the rest of a burst of kills land before sending
+            await asyncio.sleep(self.batch_window)
+            self._wake.clear()
+            await self.drain()
+
+    async def drain(self):
+        """Sends everything queued so far right away."""
+        game_names, self._pending = self._pending, set()
+        for game_name in game_names:
+            try:
+                retry_in = await self._flush(game_name)
+            except Exception as err:
+                error(f"Sending announcements of {game_name} failed: {type(err)=} {str(err)=}")
+                retry_in = self._back_off(game_name)
+            if retry_in is not None:
+                asyncio.get_running_loop().call_later(retry_in, self.notify, game_name)
+
+    def _back_off(self, game_name: str) -> float:
+        delay = min(self.max_backoff, self._backoff.get(game_name, 0.5) * 2)
+        self._backoff[game_name] = delay
+        return delay
+
+    async def _pace(self, channel_id: int):
+        loop = asyncio.get_running_loop()
+        if (wait := self._next_send.get(channel_id, 0.0) - loop.time()) > 0:
+            await asyncio.sleep(wait)
+        self._next_send[channel_id] = loop.time() + self.min_interval
+
+    async def _flush(self, game_name: str) -> float | None:
+        """Sends a game's outbox.
+
+        Returns:
+            seconds until the rest should be retried, None if it was all sent
+        """
+        if (game := await game_router.open_game(game_name)) is None:
+            # Archived, its messages stay in its database
+            return None
+        with playing(game):
+            while rows := await game.db.get_pending_announcements(self.batch_size):
+                for channel_id, announcement_ids, content in _coalesce(rows):
+                    if (channel := self.bot.get_channel(channel_id)) is None:
+                        error(f"Kill channel {channel_id} of {game_name} not found, retrying later")
+                        return self._back_off(game_name)
+                    await self._pace(channel_id)
+                    try:
+                        await channel.send(content)
+                    except (discord.Forbidden, discord.NotFound) as err:
+                        error(f"Dropping {len(announcement_ids)} announcements the bot can't send to {channel_id}: {err}")
+                    except discord.HTTPException as err:
+                        # Rate limits the client gave up retrying, or a discord outage
+                        error(f"Sending announcements to {channel_id} failed ({err.status}), retrying later")
+                        return self._back_off(game_name)
+                    await game.db.delete_announcements(announcement_ids)
+                if len(rows) < self.batch_size:
+                    break
+        self._backoff.pop(game_name, None)
+        return None
+
+
+kill_announcer = KillAnnouncer()
@@ -0,0 +1,288 @@
+# Module to run `database.py` off the event loop
+import asyncio
+import functools
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable
+
+import database
+from command_log import record_db_call
+from logger import error
+from metrics import DB_GROUP_SIZE, timed_db_call
+from pool import ConnectionPool, db_pool
+from state import GameState, game_state
+
+# Queued to stop an `AsyncDatabase`'s writer thread
+_STOP = object()
+
+def _call_name(fn: Callable[..., Any]) -> str:
+    return getattr(fn, "__name__", type(fn).__name__)
+
+
+class AsyncDatabase:
+    """Awaitable facade over the functions in `database.py`.
+
+    Reads run on a pool of threads with a pooled reader connection each, writes are
+    serialized through a single writer thread holding the writer connection. Writes of
+    `GROUP_COMMIT_FUNCTIONS` arriving together are committed as a group, see
+    `_writer_loop`. Every function listed in `READ_FUNCTIONS`/`WRITE_FUNCTIONS` is
+    exposed as a coroutine taking the same arguments minus `con`, e.g.
+    `await db.get_target_info(player_id)`. Writes that maintain in-memory state are
+    handed `state` automatically. Every call is counted and timed in `metrics` by the
+    name of the function run.
+    """
+    READ_FUNCTIONS = frozenset({
+        "get_player_target",
+        "get_player_info",
+        "get_target_info_by_secret_word",
+        "get_target_info",
+        "get_last_kill",
+        "get_all_kills",
+        "get_kills_on_date",
+        "get_kills_between_dates",
+        "get_top_kills",
+        "get_top_kills_between_dates",
+        "get_top_kills_on_date",
+        "get_all_players",
+        "get_target_assignments",
+        "get_kills_page",
+        "get_players_page",
+        "get_target_assignments_page",
+        "get_snapshots",
+        "find_journal_problems",
+        "get_pending_announcements",
+    })
+
+    WRITE_FUNCTIONS = frozenset({
+        "db_setup",
+        "add_initial_data",
+        "add_generated_data",
+        "eliminate_player",
+        "undo_last_kill",
+        "set_player_secret_word",
+        "delete_all_data",
+        "rebuild_from_journal",
+        "queue_announcement",
+        "delete_announcements",
+    })
+
+    STATEFUL_FUNCTIONS = frozenset({
+        "add_initial_data",
+        "add_generated_data",
+        "eliminate_player",
+        "undo_last_kill",
+        "set_player_secret_word",
+        "delete_all_data",
+        "rebuild_from_journal",
+    })
+
+    # Small mutations that can share a transaction: each runs in its own SAVEPOINT, so
+    # one failing leaves the rest of its group intact
+    GROUP_COMMIT_FUNCTIONS = frozenset({
+        "eliminate_player",
+        "undo_last_kill",
+        "set_player_secret_word",
+        "queue_announcement",
+        "delete_announcements",
+    })
+
+    def __init__(self, pool: ConnectionPool, state: GameState, group_commit_window: float = 0.002, max_group_size: int = 64):
+        self.pool = pool
+        self.state = state
+        self.group_commit_window = group_commit_window
+        self.max_group_size = max_group_size
+        self._read_executor = ThreadPoolExecutor(max_workers=pool.max_readers, thread_name_prefix="db-read")
+        # (fn, args, kwargs, future, submitted) in arrival order, `_STOP` to stop the writer
+        self._write_queue: queue.SimpleQueue[tuple | object] = queue.SimpleQueue()
+        self._writer_thread: threading.Thread | None = None
+        self._writer_lock = threading.Lock()
+        self._closed = False
+
+    def _run_read(self, fn: Callable[..., Any], args: tuple, kwargs: dict, submitted: float) -> tuple[Any, float]:
+        with self.pool.reader() as con:
+            waited = time.perf_counter() - submitted
+            with timed_db_call(_call_name(fn)):
+                return fn(con, *args, **kwargs), waited
+
+    def _run_write(self, write: tuple):
+        fn, args, kwargs, future, submitted = write
+        if not future.set_running_or_notify_cancel():
+            return
+        with self.pool.writer() as con:
+            waited = time.perf_counter() - submitted
+            try:
+                with timed_db_call(_call_name(fn)):
+                    result = fn(con, *args, **kwargs)
+            except BaseException as err:
+                try:
+                    if getattr(fn, "__name__", None) in self.STATEFUL_FUNCTIONS:
+                        # `state` may have been updated before the transaction rolled back
+                        self.state.load(con)
+                finally:
+                    database.bump_game_state_version(self.pool.database_path)
+                    future.set_exception(err)
+                return
+            # Before answering, so the caller can't be served a page cached before its write. Renders
+            # that raced the write go stale too, as `state` is only updated once it committed
+            database.bump_game_state_version(self.pool.database_path)
+            future.set_result((result, waited))
+
+    def _run_group(self, group: list[tuple]):
+        """Runs writes in one transaction, each in a SAVEPOINT, answering callers only after the commit.
+
+        `state` is reloaded before anyone is answered if any write failed, as its hooks
+        run inside the savepoint that was rolled back.
+        """
+        outcomes = []
+        with self.pool.writer() as con:
+            try:
+                con.execute("BEGIN IMMEDIATE")
+                for fn, args, kwargs, future, submitted in group:
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    waited = time.perf_counter() - submitted
+                    try:
+                        with database.transaction(con), timed_db_call(_call_name(fn)):
+                            outcomes.append((future, (fn(con, *args, **kwargs), waited), None))
+                    except Exception as err:
+                        outcomes.append((future, None, err))
+                con.commit()
+                if any(err is not None for _, _, err in outcomes):
+                    # A failed write may have updated `state` before its savepoint rolled back
+                    self.state.load(con)
+            except BaseException as err:
+                # Nothing was committed, but `state` already applied the writes that succeeded
+                if con.in_transaction:
+                    con.rollback()
+                try:
+                    self.state.load(con)
+                finally:
+                    for future, _, _ in outcomes:
+                        future.set_exception(err)
+                    for _, _, _, future, _ in group:
+                        if not future.done():
+                            future.set_exception(err)
+                raise
+            finally:
+                database.bump_game_state_version(self.pool.database_path)
+        DB_GROUP_SIZE.observe(len(outcomes))
+        for future, result, err in outcomes:
+            if err is None:
+                future.set_result(result)
+            else:
+                future.set_exception(err)
+
+    def _is_groupable(self, write: tuple | object) -> bool:
+        return write is not _STOP and getattr(write[0], "__name__", None) in self.GROUP_COMMIT_FUNCTIONS
+
+    def _writer_loop(self):
+        """Runs queued writes in order until stopped.
+
+        A groupable write waits up to `group_commit_window` for more to arrive, and runs
+        with every groupable write queued behind it as one transaction (one fsync). Any
+        other write ends the group and runs on its own after it.
+        """
+        write = self._write_queue.get()
+        while write is not _STOP:
+            if not self._is_groupable(write):
+                self._run_write(write)
+                write = self._write_queue.get()
+                continue
+
+            group = [write]
+            write = None
+            deadline = time.perf_counter() + self.group_commit_window
+            while len(group) < self.max_group_size:
+                try:
+                    write = self._write_queue.get(timeout=max(0.0, deadline - time.perf_counter()))
+                except queue.Empty:
+                    write = None
+                    break
+                if not self._is_groupable(write):
+                    break
+                group.append(write)
+                write = None
+            try:
+                self._run_group(group)
+            except Exception as err:
+                # Every caller in the group already got the error
+                error(f"Group commit of {len(group)} writes failed: {type(err)=} {str(err)=}")
+            if write is None:
+                write = self._write_queue.get()
+
+    async def _submit(self, executor: ThreadPoolExecutor, run: Callable[..., tuple[Any, float]], fn: Callable[..., Any],
+                      args: tuple, kwargs: dict) -> Any:
+        loop = asyncio.get_running_loop()
+        submitted = time.perf_counter()
+        result, waited = await loop.run_in_executor(executor, run, fn, args, kwargs, submitted)
+        record_db_call(time.perf_counter() - submitted, waited)
+        return result
+
+    def state_version(self) -> int:
+        """Returns a counter that changes whenever a write to this database finishes.
+
+        Read it *before* querying, so a write landing mid-render leaves what was built stale.
+        """
+        return database.get_game_state_version(self.pool.database_path)
+
+    async def read(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Runs `fn(con, *args, **kwargs)` with a reader connection on the read pool."""
+        return await self._submit(self._read_executor, self._run_read, fn, args, kwargs)
+
+    def _start_writer(self):
+        with self._writer_lock:
+            if self._closed:
+                raise RuntimeError("cannot schedule new writes after shutdown")
+            if self._writer_thread is None:
+                self._writer_thread = threading.Thread(target=self._writer_loop, name="db-write", daemon=True)
+                self._writer_thread.start()
+
+    async def write(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Runs `fn(con, *args, **kwargs)` with the writer connection on the writer thread.
+
+        Writes run in the order they were queued, and results are only returned once committed.
+        """
+        self._start_writer()
+        future = Future()
+        submitted = time.perf_counter()
+        self._write_queue.put((fn, args, kwargs, future, submitted))
+        result, waited = await asyncio.wrap_future(future)
+        record_db_call(time.perf_counter() - submitted, waited)
+        return result
+
+    async def roll_back_kills_to_id(self, rollback_id: int, dry_run: bool = False) -> tuple[int, list[database.TARGET_CHANGE]]:
+        def roll_back_kills_to_id(con):
+            return database.roll_back_kills_to_id(rollback_id, con, self.state, dry_run)
+        return await self.write(roll_back_kills_to_id)
+
+    async def get_leaderboard(self, start: int = 0, stop: int | None = None) -> list[database.KILL_SUMMARY]:
+        """Returns players ranked `start` through `stop` (exclusive) by kill count, served from memory."""
+        return self.state.leaderboard.page(start, stop)
+
+    async def find_state_problems(self) -> list[str]:
+        """Checks the in-memory game state against the database."""
+        return await self.write(self.state.find_problems)
+
+    def __getattr__(self, name: str) -> Callable[..., Any]:
+        if name in self.READ_FUNCTIONS:
+            return functools.partial(self.read, getattr(database, name))
+        if name in self.STATEFUL_FUNCTIONS:
+            return functools.partial(self.write, getattr(database, name), state=self.state)
+        if name in self.WRITE_FUNCTIONS:
+            return functools.partial(self.write, getattr(database, name))
+        raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+
+    def shutdown(self):
+        """Waits for queued work to finish and stops the worker threads."""
+        with self._writer_lock:
+            self._closed = True
+            writer_thread = self._writer_thread
+        if writer_thread is not None:
+            self._write_queue.put(_STOP)
+            writer_thread.join()
+        self._read_executor.shutdown(wait=True)
+
+
+db = AsyncDatabase(db_pool, game_state)
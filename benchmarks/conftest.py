@@ -0,0 +1,114 @@
+# Shared setup for the database.py benchmark suite
+#
+#   pip install -r benchmarks/requirements.txt
+#   pytest benchmarks --benchmark-save=baseline                  # record a baseline
+#   pytest benchmarks --benchmark-compare                        # fail on >20% median regression vs the latest baseline
+#   pytest benchmarks --scales 100,10000 --benchmark-compare     # skip the slow 1M game
+#
+# Baselines are JSON files under benchmarks/baselines/<platform>/, committed so regressions show up in review.
+# --benchmark-compare only looks at the current platform's folder, and the timings only mean something on
+# comparable hardware: record a fresh baseline (and commit it) when moving the suite to another machine.
+import random
+import shutil
+import sqlite3
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import logger
+from database import create_db_connection, db_setup, refresh_player_stats, transaction, TIMESTAMP_FORMAT
+from ring import TargetRing
+from snapshots import take_snapshot
+
+BASELINE_DIR = Path(__file__).resolve().parent / "baselines"
+DEFAULT_SCALES = "100,10000,1000000"
+REGRESSION_THRESHOLD = "median:20%"
+GAME_START = datetime(2025, 1, 6, 9, 0, 0)
+GAME_DAYS = 28
+
+
+def pytest_addoption(parser):
+    parser.addoption("--scales", default=DEFAULT_SCALES,
+                     help=f"comma separated player counts to build games for (default {DEFAULT_SCALES})")
+
+def pytest_configure(config):
+    if config.getoption("benchmark_storage", None) == "file://./.benchmarks":
+        config.option.benchmark_storage = f"file://{BASELINE_DIR}"
+    if config.getoption("benchmark_compare", None) and not config.getoption("benchmark_compare_fail", None):
+        from pytest_benchmark.utils import parse_compare_fail
+        config.option.benchmark_compare_fail = [parse_compare_fail(REGRESSION_THRESHOLD)]
+
+def pytest_generate_tests(metafunc):
+    if "scale" in metafunc.fixturenames:
+        scales = [int(scale) for scale in metafunc.config.getoption("scales").split(",") if scale.strip()]
+        metafunc.parametrize("scale", scales, ids=[f"{scale}players" for scale in scales], scope="session")
+
+
+@pytest.fixture(scope="session", autouse=True)
+def quiet_logs():
+    """Drops everything below ERROR, so benchmarks don't fill log.txt and debug_log.txt."""
+    logger.configure("ERROR")
+
+
+def build_game(path: Path, player_count: int, seed: int = 0) -> list[str]:
+    """Writes a game of `player_count` players, half of them already eliminated, straight into `path`.
+
+    Kills are spread over four weeks so date range queries have realistic selectivity.
+
+    Returns:
+        the players still alive
+    """
+    rng = random.Random(seed)
+    players = [f"player{i:07d}" for i in range(player_count)]
+    rng.shuffle(players)
+    ring = TargetRing()
+    ring.load_assignments([(player, players[(i + 1) % player_count]) for i, player in enumerate(players)])
+
+    alive = list(players)
+    kill_count = player_count // 2
+    kills = []
+    for kill_id in range(1, kill_count + 1):
+        index = rng.randrange(len(alive))
+        alive[index], alive[-1] = alive[-1], alive[index]
+        eliminated = alive.pop()
+        hunter, _ = ring.eliminate(eliminated)
+        timestamp = GAME_START + timedelta(seconds=kill_id * GAME_DAYS * 86400 // (kill_count + 1))
+        kills.append((kill_id, hunter, eliminated, timestamp.strftime(TIMESTAMP_FORMAT), timestamp.strftime("%Y-%m-%d"), hunter))
+
+    con = create_db_connection("IMMEDIATE", 30, str(path))
+    db_setup(con)
+    with transaction(con):
+        con.executemany("INSERT INTO player_info (discord_id, player_name, group_name, secret_word) VALUES (?, ?, ?, ?)",
+                        ((player, player.title(), f"Group {i % 12}", f"secret{i}") for i, player in enumerate(players)))
+        con.executemany("INSERT INTO target_assignments (player_discord_id, target_discord_id) VALUES (?, ?)", iter(ring))
+        con.executemany("""INSERT INTO kill_log (id, player_discord_id, target_discord_id, TIMESTAMP, local_date, hunter_discord_id)
+                        VALUES (?, ?, ?, ?, ?, ?)""", kills)
+        con.execute("""INSERT INTO daily_kills (local_date, player_discord_id, kills)
+                    SELECT local_date, player_discord_id, COUNT(*) FROM kill_log GROUP BY local_date, player_discord_id""")
+        refresh_player_stats(con)
+        take_snapshot(con)
+    con.close()
+    return alive
+
+
+@pytest.fixture(scope="session")
+def game_template(scale, tmp_path_factory) -> tuple[Path, list[str]]:
+    """A pristine game of `scale` players, built once per session and copied by `game`."""
+    path = tmp_path_factory.mktemp(f"game{scale}") / "template.db"
+    alive = build_game(path, scale)
+    return path, alive
+
+
+@pytest.fixture
+def game(game_template, tmp_path) -> tuple[sqlite3.Connection, list[str]]:
+    """A writable copy of the game template and the players alive in it."""
+    template, alive = game_template
+    path = tmp_path / "game.db"
+    shutil.copyfile(template, path)
+    con = create_db_connection("IMMEDIATE", 30, str(path))
+    yield con, list(alive)
+    con.close()
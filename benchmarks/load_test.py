@@ -0,0 +1,224 @@
+# Drives the slash command coroutines offline with stub discord objects and reports latency
+#
+#   python benchmarks/load_test.py --players 300 --bursts 60
+#
+# Nothing talks to discord: commands are invoked directly with a stub context that
+# records what they respond with. The game lives in a scratch database.
+import argparse
+import asyncio
+import csv
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+_scratch = tempfile.TemporaryDirectory()
+os.environ["SOCKBOT_DATABASE_PATH"] = str(Path(_scratch.name) / "load_test.db")
+# config.py insists on these, their values never matter offline
+for name in ("TOKEN", "GUILD_ID", "ERROR_CHANNEL_ID", "KILL_CHANNEL_ID"):
+    os.environ.setdefault(name, "0" if name != "TOKEN" else "offline")
+
+import logger
+import metrics
+from command_log import percentile
+from config import GUILD_ID
+
+
+class StubChannel:
+    """Text channel that keeps what is sent to it."""
+    def __init__(self, api_latency: float = 0.0):
+        self.api_latency = api_latency
+        self.messages: list[str] = []
+
+    async def send(self, content: str | None = None, **kwargs):
+        await asyncio.sleep(self.api_latency)
+        self.messages.append(content)
+
+
+class StubBot:
+    """Just enough of `discord.Bot` for the cogs: every channel is one `StubChannel`."""
+    def __init__(self, channel: StubChannel):
+        self.channel = channel
+
+    def get_channel(self, channel_id: int) -> StubChannel:
+        return self.channel
+
+
+class _StubUser:
+    def __init__(self, name: str):
+        self.name = name
+
+
+class _StubCommand:
+    def __init__(self, name: str):
+        self.name = self.qualified_name = name
+
+
+class _StubFollowup:
+    def __init__(self, ctx: "StubContext"):
+        self.ctx = ctx
+
+    async def send(self, content: str | None = None, **kwargs):
+        await self.ctx.send(content, **kwargs)
+
+
+class StubContext:
+    """Stand-in for `discord.ApplicationContext` invoked by `author_name`.
+
+    Responses are recorded in `responses` after sleeping `api_latency` seconds, like a
+    round trip to discord would.
+    """
+    def __init__(self, author_name: str, command_name: str, channel: StubChannel, api_latency: float = 0.0):
+        self.author = self.user = _StubUser(author_name)
+        self.command = _StubCommand(command_name)
+        self.guild_id = GUILD_ID
+        self.channel_id = 0
+        self.interaction = None
+        self.channel = channel
+        self.api_latency = api_latency
+        self.responses: list[str] = []
+        self.deferred = False
+        self.followup = _StubFollowup(self)
+
+    async def respond(self, content: str | None = None, **kwargs):
+        await asyncio.sleep(self.api_latency)
+        self.responses.append(content)
+
+    async def send(self, content: str | None = None, **kwargs):
+        await self.channel.send(content, **kwargs)
+
+    async def defer(self, **kwargs):
+        await asyncio.sleep(self.api_latency)
+        self.deferred = True
+
+
+def write_roster(path: Path, player_count: int, seed: int) -> dict[str, str]:
+    """Writes an ingestable CSV of `player_count` players in one target ring.
+
+    Returns:
+        the secret word of every player
+    """
+    rng = random.Random(seed)
+    players = [f"player{i:04d}" for i in range(player_count)]
+    rng.shuffle(players)
+    secrets = {player: f"sock{rng.randrange(10**6):06d}{i}" for i, player in enumerate(players)}
+    with open(path, "w", newline="") as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(["Discord ID", "Name", "Group", "Target_discord_id", "Secret Word"])
+        for i, player in enumerate(players):
+            writer.writerow([player, player.title(), f"Group {i % 12}", players[(i + 1) % player_count], secrets[player]])
+    return secrets
+
+
+class LoadTest:
+    """Fires bursts of concurrent commands from random players and times each one."""
+    def __init__(self, secrets: dict[str, str], api_latency: float, seed: int):
+        import bot as bot_module
+        from cogs.stat import Stat
+        from state import game_state
+
+        self.bot_module = bot_module
+        self.game_state = game_state
+        self.channel = StubChannel(api_latency)
+        self.stat = Stat(StubBot(self.channel))
+        self.secrets = secrets
+        self.players = list(secrets)
+        self.api_latency = api_latency
+        self.rng = random.Random(seed)
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+        self.lock_errors = 0
+
+    def _pick_command(self, alive: list[str]):
+        roll = self.rng.random()
+        commands = self.bot_module
+        if roll < 0.45:
+            return "get-target", commands.target.callback, ()
+        if roll < 0.55:
+            victim = self.rng.choice(alive)
+            return "sock", commands.sock_player.callback, (self.secrets[victim],)
+        if roll < 0.80:
+            return "sock (wrong secret)", commands.sock_player.callback, (f"not-{self.rng.randrange(10**6)}",)
+        if roll < 0.92:
+            return "get-secret", commands.retrieve_secret_word.callback, ()
+        name, command = self.rng.choice([("stat-top-kills", self.stat.top_kills), ("stat-all-kills", self.stat.all_kills),
+                                         ("stat-active-players", self.stat.active_players)])
+        return name, lambda ctx: command.callback(self.stat, ctx), ()
+
+    async def _invoke(self, player: str, alive: list[str]):
+        name, callback, args = self._pick_command(alive)
+        ctx = StubContext(player, name, self.channel, self.api_latency)
+        start = time.perf_counter()
+        try:
+            await callback(ctx, *args)
+        except Exception as err:
+            original = getattr(err, "original", err)
+            self.errors[name] += 1
+            if isinstance(original, sqlite3.OperationalError) and ("locked" in str(original) or "busy" in str(original)):
+                self.lock_errors += 1
+        finally:
+            self.latencies[name].append(time.perf_counter() - start)
+
+    async def run(self, bursts: int, burst_size: int, pause: float) -> float:
+        start = time.perf_counter()
+        for _ in range(bursts):
+            # Eliminated players mostly stop playing
+            alive = [player for player in self.players if self.game_state.players.get_active_player(player)]
+            players = self.rng.choices(alive, k=burst_size)
+            await asyncio.gather(*(self._invoke(player, alive) for player in players))
+            if pause:
+                await asyncio.sleep(pause)
+        return time.perf_counter() - start
+
+
+def report(test: LoadTest, elapsed: float, busy_errors: float):
+    total = sum(len(samples) for samples in test.latencies.values())
+    print(f"{total} commands in {elapsed:.2f}s: {total / elapsed:,.0f} commands/sec")
+    print(f"{'command':<24}{'count':>7}{'errors':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for name, samples in sorted(test.latencies.items()):
+        samples.sort()
+        p50, p95, p99 = (percentile(samples, p) * 1000 for p in (50, 95, 99))
+        print(f"{name:<24}{len(samples):>7}{test.errors[name]:>8}{p50:>9.1f}{p95:>9.1f}{p99:>9.1f}{samples[-1] * 1000:>9.1f}")
+    kills = sum(message.count("Kill ID") for message in test.channel.messages if message)
+    print(f"kills announced: {kills}, lock errors: {test.lock_errors} (sqlite busy counter: {int(busy_errors)})")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Offline load test of the slash commands")
+    parser.add_argument("--players", type=int, default=300, help="synthetic roster size")
+    parser.add_argument("--bursts", type=int, default=60, help="number of bursts of concurrent commands")
+    parser.add_argument("--burst-size", type=int, default=50, help="commands fired concurrently per burst")
+    parser.add_argument("--pause", type=float, default=0.0, help="seconds between bursts")
+    parser.add_argument("--api-latency-ms", type=float, default=0.0, help="simulated discord round trip per response")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logger.configure("ERROR")
+    from async_database import db
+
+    roster = Path(_scratch.name) / "roster.csv"
+    secrets = write_roster(roster, args.players, args.seed)
+    await db.db_setup()
+    await db.add_initial_data(str(roster))
+    from games import game_router
+    from announcer import kill_announcer
+    game_router.setup()
+    await game_router.warm_up()
+
+    test = LoadTest(secrets, args.api_latency_ms / 1000, args.seed)
+    kill_announcer.start(StubBot(test.channel))
+    busy_before = metrics.SQLITE_BUSY.get()
+    elapsed = await test.run(args.bursts, args.burst_size, args.pause)
+    await kill_announcer.drain()
+    report(test, elapsed, metrics.SQLITE_BUSY.get() - busy_before)
+    db.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
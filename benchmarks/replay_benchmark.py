@@ -0,0 +1,95 @@
+# Measures event journal replay throughput on a synthetic game
+#
+#   python benchmarks/replay_benchmark.py --events 100000
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from database import create_db_connection, db_setup, transaction
+from journal import EVENT, append_event, replay
+from ring import TargetRing
+
+
+def build_synthetic_journal(con, total_events: int, seed: int = 0) -> dict[str, str]:
+    """Writes a plausible game of `total_events` events straight into `game_events`.
+
+    A third of the events ingest players, the rest are kills, undos of the latest
+    kill and secret word resets. Returns the expected final target assignments.
+    """
+    rng = random.Random(seed)
+    player_count = max(2, total_events // 3)
+    players = [f"player{i}" for i in range(player_count)]
+    rng.shuffle(players)
+
+    ring = TargetRing()
+    ring.load_assignments([(player, players[(i + 1) % player_count]) for i, player in enumerate(players)])
+    events: list[tuple[str, dict]] = [
+        (EVENT.INGEST, {"player": player, "name": player.upper(), "group": f"group{i % 12}",
+                        "secret_word": f"word{i}", "target": ring.get_target(player)})
+        for i, player in enumerate(players)
+    ]
+
+    alive = list(players)
+    kills: list[tuple[int, str, str]] = []
+    next_kill_id = 1
+    while len(events) < total_events:
+        roll = rng.random()
+        if roll < 0.1 and kills:
+            kill_id, eliminated, hunter = kills.pop()
+            ring.revive(eliminated, hunter)
+            alive.append(eliminated)
+            events.append((EVENT.UNDO, {"kill_id": kill_id}))
+        elif roll < 0.3:
+            player = rng.choice(alive)
+            events.append((EVENT.SECRET_RESET, {"player": player, "secret_word": f"reset{len(events)}"}))
+        elif len(alive) > 1:
+            index = rng.randrange(len(alive))
+            alive[index], alive[-1] = alive[-1], alive[index]
+            eliminated = alive.pop()
+            hunter, _ = ring.eliminate(eliminated)
+            kills.append((next_kill_id, eliminated, hunter))
+            events.append((EVENT.KILL, {"kill_id": next_kill_id, "player": hunter, "eliminated": eliminated, "hunter": hunter}))
+            next_kill_id += 1
+
+    with transaction(con):
+        for event_type, payload in events:
+            append_event(con, event_type, payload)
+    return dict(ring)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark event journal replay")
+    parser.add_argument("--events", type=int, default=100_000, help="number of synthetic events")
+    parser.add_argument("--runs", type=int, default=3, help="number of timed replays")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        con = create_db_connection("IMMEDIATE", 30, str(Path(directory) / "replay.db"))
+        db_setup(con)
+
+        start = time.perf_counter()
+        expected = build_synthetic_journal(con, args.events)
+        print(f"built {args.events} events in {time.perf_counter() - start:.2f}s")
+
+        timings = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            state = replay(con)
+            timings.append(time.perf_counter() - start)
+
+        if state.assignments != expected:
+            sys.exit("replayed target assignments do not match the simulated game")
+
+        best = min(timings)
+        print(f"replayed {state.events_applied} events: best {best:.3f}s, "
+              f"{state.events_applied / best:,.0f} events/sec over {args.runs} runs")
+        con.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# Benchmarks of the database.py operations the bot runs, at every `--scales` game size
+from datetime import datetime
+
+import pytest
+
+import database
+from state import GameState
+
+WEEK_START = datetime(2025, 1, 13)
+WEEK_END = datetime(2025, 1, 19)
+ROUNDS = 20
+
+
+@pytest.fixture
+def state(game) -> GameState:
+    con, _ = game
+    state = GameState()
+    state.load(con)
+    return state
+
+
+def test_eliminate_player(benchmark, game, state):
+    con, alive = game
+    victims = iter(alive)
+    benchmark.pedantic(lambda victim: database.eliminate_player(con, victim, state=state),
+                       setup=lambda: ((next(victims),), {}), rounds=ROUNDS)
+
+
+def test_undo_last_kill(benchmark, game, state):
+    con, alive = game
+    victims = iter(alive)
+
+    def kill():
+        database.eliminate_player(con, next(victims), state=state)
+        return (), {}
+    benchmark.pedantic(lambda: database.undo_last_kill(con, state=state), setup=kill, rounds=ROUNDS)
+
+
+def test_roll_back_kills_to_id(benchmark, game, state):
+    con, alive = game
+    victims = iter(alive)
+
+    def kill_ten():
+        rollback_id = con.execute("SELECT MAX(id) FROM kill_log").fetchone()[0]
+        for _ in range(10):
+            database.eliminate_player(con, next(victims), state=state)
+        return (rollback_id,), {}
+    benchmark.pedantic(lambda rollback_id: database.roll_back_kills_to_id(rollback_id, con, state), setup=kill_ten,
+                       rounds=min(ROUNDS, len(alive) // 11))
+
+
+def test_get_last_kill(benchmark, game):
+    con, _ = game
+    benchmark(database.get_last_kill, con)
+
+
+def test_get_all_players(benchmark, game):
+    con, _ = game
+    benchmark(database.get_all_players, con)
+
+
+def test_get_top_kills(benchmark, game):
+    con, _ = game
+    benchmark(database.get_top_kills, con)
+
+
+def test_get_kills_between_dates(benchmark, game):
+    con, _ = game
+    benchmark(database.get_kills_between_dates, con, WEEK_START, WEEK_END)
+
+
+def test_get_kills_on_date(benchmark, game):
+    con, _ = game
+    benchmark(database.get_kills_on_date, con, WEEK_START)
+
+
+def test_get_top_kills_between_dates(benchmark, game):
+    con, _ = game
+    benchmark(database.get_top_kills_between_dates, con, WEEK_START, WEEK_END)
+
+
+def test_get_kills_page(benchmark, game):
+    con, _ = game
+    middle = con.execute("SELECT MAX(id) / 2 FROM kill_log").fetchone()[0]
+    benchmark(database.get_kills_page, con, after_id=middle)
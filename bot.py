@@ -1,14 +1,45 @@
+import time
+# Taken before the slow imports, startup phases are timed from here
+_STARTED = time.perf_counter()
+
+import asyncio
 import discord
 import random
 from database import *
-from config import TOKEN, GUILD_IDS, YOU_HAVE_NO_ENEMIES, ITS_JOEVER, ERROR_CHANNEL_ID, SOCKED_MESSAGE_TEMPLATES, KILL_CHANNEL_ID 
-from logger import error, info, debug 
+from pool import db_pool
+from games import db, game_router, current_game, in_game
+from config import TOKEN, GUILD_IDS, YOU_HAVE_NO_ENEMIES, ITS_JOEVER, ERROR_CHANNEL_ID, SOCKED_MESSAGE_TEMPLATES, GAME_TIMEZONE
+from config import LOG_LEVEL, LOG_MAX_MB, LOG_ROTATE_HOURS, LOG_BACKUP_COUNT, COMMAND_LOG, METRICS_PORT
+from logger import error, info, debug, configure as configure_logging
+import command_log
+from announcer import kill_announcer
+import metrics
+from metrics import instrument_command
+from deferral import deferred
+from startup import StartupTimer
 
 bot = discord.Bot()
 FREE_FOR_ALL = True
+_metrics_started = False
+startup = StartupTimer(_STARTED)
+_warm_up_task: asyncio.Task | None = None
+
 @bot.event
 async def on_ready():
+    global _metrics_started
     info(f"{bot.user} is ready and online!")
+    # on_ready fires again after every reconnect
+    if not _metrics_started:
+        _metrics_started = True
+        startup.mark("gateway")
+        if _warm_up_task is not None:
+            await _warm_up_task
+        info(startup.report())
+        bot.loop.create_task(metrics.monitor_event_loop_lag())
+        bot.loop.create_task(game_router.evict_idle_games())
+        kill_announcer.start(bot)
+        if METRICS_PORT:
+            await metrics.start_http_server(METRICS_PORT)
 
 @bot.event
 async def on_application_command_error(ctx: discord.ApplicationContext, err: Exception):
@@ -22,18 +53,20 @@ async def on_application_command_error(ctx: discord.ApplicationContext, err: Exc
     raise err
 
 @bot.slash_command(guild_ids=GUILD_IDS, name="rules", description="The rules of the competition!")
+@instrument_command
 async def rules(ctx: discord.ApplicationContext):
     with open('rules.md') as f:
         rules ='\n'.join(line.rstrip() for line in f)
     await ctx.respond(rules, ephemeral=True)
 
 @bot.slash_command(guild_ids=GUILD_IDS, name="get-target", description="Tells you who your Target is")
+@instrument_command
+@in_game
 async def target(ctx: discord.ApplicationContext):
     WIN_MESSAGE = f"# You win! \nyou have no enemies... It's over.\n\n\n{YOU_HAVE_NO_ENEMIES}"
     LOSE_MESSAGE = f"# You've been eliminated! \n\n\n{ITS_JOEVER}"
     player_discord_id = ctx.author.name
-    con = create_db_connection()
-    if (target_info := get_target_info(con, player_discord_id)) is None:
+    if (target_info := await db.get_target_info(player_discord_id)) is None:
         await ctx.respond(LOSE_MESSAGE, ephemeral=True)
         return
     target_id, target_name, group_name, _ = target_info
@@ -43,47 +76,42 @@ async def target(ctx: discord.ApplicationContext):
     await ctx.respond(f"Your target is {target_name} (discord: `@{target_id}`) from {group_name}", ephemeral=True)
 
 @bot.slash_command(guild_ids=GUILD_IDS, name="get-secret", description="Tells you your Secret Word")
+@instrument_command
+@in_game
 async def retrieve_secret_word(ctx: discord.ApplicationContext):
     player_discord_id = ctx.author.name
-    con = create_db_connection()
-    player_name, _, secret_word = get_player_info(con, player_discord_id)
+    player_name, _, secret_word = await db.get_player_info(player_discord_id)
     await ctx.respond(f"Hi {player_name}, Your Secret Word is ||{secret_word}||", ephemeral=True)
 
 @bot.slash_command(guild_ids=GUILD_IDS, name="sock", description="Sock your target with their secret word!")
 @discord.option("secret word", description="Your target's secret word")
+@instrument_command
+@deferred(ephemeral=True)
+@in_game
 async def sock_player(ctx: discord.ApplicationContext, secret_word: str):
     player_discord_id = ctx.author.name
-    con = create_db_connection()
 
     if FREE_FOR_ALL:
-        is_eliminated = True
-        player_name = ''
-        if (all_players := get_all_players(con, active_players_only=True)) is None:
-            await ctx.respond(f"No such player exists: `@{player_discord_id}`", ephemeral=True)
-            return
-        for player in all_players:
-            if player.player_id == player_discord_id:
-                is_eliminated = False 
-                player_name = player.player_name
-                break
-        if is_eliminated:
+        if (player := current_game().state.players.get_active_player(player_discord_id)) is None:
             LOSE_MESSAGE = f"# You've been eliminated! \n\n\n{ITS_JOEVER}"
             await ctx.respond(LOSE_MESSAGE, ephemeral=True)
             return
+        player_name = player.player_name
 
     else: 
-        if (player_info := get_player_info(con, player_discord_id)) is None:
+        if (player_info := await db.get_player_info(player_discord_id)) is None:
             await ctx.respond(f"No such player exists: `@{player_discord_id}`", ephemeral=True)
             return
 
         player_name, _, _ = player_info
 
     if FREE_FOR_ALL:
-        if (target_info := get_target_info_by_secret_word(con, secret_word)) is None:
+        if (target := current_game().state.players.get_active_player_by_secret_word(secret_word)) is None:
             await ctx.respond(f"No player with secret: {secret_word}", ephemeral=True)
             return
+        target_info = (target.player_id, target.player_name, target.group_name, target.secret_word)
     else:
-        if (target_info := get_target_info(con, player_discord_id)) is None:
+        if (target_info := await db.get_target_info(player_discord_id)) is None:
             await ctx.respond(f"You have no enemies... It's over.\n\n\n{YOU_HAVE_NO_ENEMIES}", ephemeral=True)
             return
 
@@ -91,16 +119,18 @@ async def sock_player(ctx: discord.ApplicationContext, secret_word: str):
 
     debug(target_info)
     if target_secret_word.strip().lower() == secret_word.strip().lower():
-        kill_id = eliminate_player(con, target_id, player_id=player_discord_id)
-
-        kill_message = random.choice(SOCKED_MESSAGE_TEMPLATES).format(player=player_name, target=target_name) 
-        kill_message += f"\n-# Kill ID: {kill_id}"
+        kill_message = random.choice(SOCKED_MESSAGE_TEMPLATES).format(player=player_name, target=target_name)
+        announcement = (kill_announcer.kill_channel_id(ctx.channel_id), kill_message)
+        kill_id = await db.eliminate_player(target_id, player_id=player_discord_id, announcement=announcement)
+        if kill_id is None:
+            # Someone got there first, or the socker was socked while this command waited on the database
+            if current_game().state.players.get_active_player(player_discord_id) is None:
+                await ctx.respond(f"# You've been eliminated! \n\n\n{ITS_JOEVER}", ephemeral=True)
+            else:
+                await ctx.respond(f"{target_name} has already been socked. Run `/get-target` to get your current target.", ephemeral=True)
+            return
 
-        channel = bot.get_channel(KILL_CHANNEL_ID)
-        if channel:
-            await channel.send(kill_message)
-        else:
-            await ctx.send(kill_message)
+        kill_announcer.notify(current_game().name)
 
         await ctx.respond(f" Run `/get-target` to get your new target.", ephemeral=True)
     else:
@@ -108,12 +138,30 @@ async def sock_player(ctx: discord.ApplicationContext, secret_word: str):
                           """, ephemeral=True)
 
 def setup():
-    con = create_db_connection()
-    db_setup(con)
-
-setup()
-bot.load_extension('cogs.admin')
-bot.load_extension('cogs.stat')
-bot.run(TOKEN)
-
-
+    startup.mark("imports")
+    configure_logging(LOG_LEVEL, int(LOG_MAX_MB * 1024 * 1024), LOG_ROTATE_HOURS, LOG_BACKUP_COUNT, COMMAND_LOG or None)
+    if COMMAND_LOG:
+        command_log.install(bot)
+    set_game_timezone(GAME_TIMEZONE or None)
+    with db_pool.writer() as con:
+        db_setup(con)
+        sync_game_timezone(con)
+    startup.mark("migrations")
+    game_router.setup()
+    startup.mark("game registry")
+
+async def warm_up():
+    """Loads the game state while the gateway connects, commands wait for it (see `GameRouter.warm_up`)."""
+    try:
+        await startup.timed("state warm-up", game_router.warm_up())
+    except Exception as err:
+        error(f"Loading the game state failed, shutting down: {type(err)=} {str(err)=}")
+        await bot.close()
+
+if __name__ == "__main__":
+    setup()
+    bot.load_extension('cogs.admin')
+    bot.load_extension('cogs.stat')
+    startup.mark("cogs")
+    _warm_up_task = bot.loop.create_task(warm_up())
+    bot.run(TOKEN)
@@ -1,11 +1,21 @@
-from config import GUILD_IDS, KILL_CHANNEL_ID, DQ_MESSAGE_TEMPLATES
+from config import GUILD_IDS, DQ_MESSAGE_TEMPLATES
+import asyncio
 import random
 from database import *
+from games import db, game_router, current_game, in_game
+from response_cache import response_cache
+from announcer import kill_announcer
+from metrics import instrument_command, summary as metrics_summary
+from deferral import deferred
 from discord.ext import commands
 from discord.commands import option
 from discord.utils import get
 import discord
 
+def _save_attachment(path: str, content: bytes):
+    with open(path, 'wb') as f:
+        f.write(content)
+
 class Admin(commands.Cog):
     def __init__(self, bot: discord.Bot):
         self.bot = bot
@@ -13,15 +23,16 @@ class Admin(commands.Cog):
     @commands.slash_command(guild_ids=GUILD_IDS, name="admin-target", description="(admin) Get a given player's target")
     @discord.default_permissions(administrator=True)
     @option("player_discord_id", description="The player's discord id")
+    @instrument_command
+    @in_game
     async def admin_target(self, ctx: discord.ApplicationContext, player_discord_id: str):
         player_discord_id = player_discord_id.strip()
-        con = create_db_connection()
-        player_info = get_player_info(con, player_discord_id)
+        player_info = await db.get_player_info(player_discord_id)
         if player_info is None:
             await ctx.respond(f"No Player associated with {player_discord_id}", ephemeral=True)
             return
         player_name, _, _ = player_info
-        target_info = get_target_info(con, player_discord_id)
+        target_info = await db.get_target_info(player_discord_id)
         if target_info is None:
             await ctx.respond(f"No target associated with {player_discord_id}", ephemeral=True)
         else:
@@ -31,10 +42,11 @@ class Admin(commands.Cog):
     @commands.slash_command(guild_ids=GUILD_IDS, name="admin-secret-word", description="(admin) Get a given player's secret word")
     @discord.default_permissions(administrator=True)
     @option("player_discord_id", description="The player's discord id")
+    @instrument_command
+    @in_game
     async def admin_secret_word(self, ctx: discord.ApplicationContext, player_discord_id: str):
         player_discord_id = player_discord_id.strip()
-        con = create_db_connection()
-        player_info = get_player_info(con, player_discord_id)
+        player_info = await db.get_player_info(player_discord_id)
         if player_info is None:
             await ctx.respond(f"No Player associated with {player_discord_id}", ephemeral=True)
         else:
@@ -44,23 +56,29 @@ class Admin(commands.Cog):
     @commands.slash_command(guild_ids=GUILD_IDS, name="admin-sock", description="(admin) Eliminate a player")
     @discord.default_permissions(administrator=True)
     @option("player_discord_id", description="The player's discord id")
+    @instrument_command
+    @in_game
     async def admin_sock(self, ctx: discord.ApplicationContext, player_discord_id: str):
-        con = create_db_connection()
-        if (player_info := get_player_info(con, player_discord_id)) is None:
+        player_info = await db.get_player_info(player_discord_id)
+        if player_info is None:
             await ctx.respond(f"No such player exists: `@{player_discord_id}`", ephemeral=True)
             return
         player_name, _, _ = player_info
-        kill_id = eliminate_player(con, player_discord_id)
+        kill_id = await db.eliminate_player(player_discord_id)
+        if kill_id is None:
+            await ctx.respond(f"{player_name} has already been eliminated", ephemeral=True)
+            return
 
         await ctx.respond(f"{player_name} has been socked! (kill ID: {kill_id})")
 
     @commands.slash_command(guild_ids=GUILD_IDS, name="admin-get-player-by-secret", description="(admin) Get a player by their secret word")
     @discord.default_permissions(administrator=True)
     @option("secret", description="The player's secret word")
+    @instrument_command
+    @in_game
     async def admin_get_player_by_secret(self, ctx: discord.ApplicationContext, secret : str):
         secret = secret.strip().lower()
-        con = create_db_connection()
-        if (target_info := get_target_info_by_secret_word(con, secret)) is None:
+        if (target_info := await db.get_target_info_by_secret_word(secret)) is None:
             await ctx.respond(f"No such player with secret word: {secret}`", ephemeral=True)
             return
         target_id, target_name, group_name, secret_word = target_info
@@ -69,34 +87,35 @@ class Admin(commands.Cog):
     @commands.slash_command(guild_ids=GUILD_IDS, name="admin-disqualify", description="(admin) Disqualify a player")
     @discord.default_permissions(administrator=True)
     @option("player_discord_id", description="The player's discord id")
+    @instrument_command
+    @in_game
     async def admin_disqualify(self, ctx: discord.ApplicationContext, player_discord_id: str):
-        con = create_db_connection()
-        if (player_info := get_player_info(con, player_discord_id)) is None:
+        player_info = await db.get_player_info(player_discord_id)
+        if player_info is None:
             await ctx.respond(f"No such player exists: `@{player_discord_id}`", ephemeral=True)
             return
         player_name, _, _ = player_info
-        kill_id = eliminate_player(con, player_discord_id, True)
-
-        kill_message = random.choice(DQ_MESSAGE_TEMPLATES).format(player=player_name) 
-        kill_message += f"\n-# Kill ID: {kill_id}"
-
+        kill_message = random.choice(DQ_MESSAGE_TEMPLATES).format(player=player_name)
+        announcement = (kill_announcer.kill_channel_id(ctx.channel_id), kill_message)
+        kill_id = await db.eliminate_player(player_discord_id, True, announcement=announcement)
+        if kill_id is None:
+            await ctx.respond(f"{player_name} has already been eliminated", ephemeral=True)
+            return
 
-        channel = self.bot.get_channel(KILL_CHANNEL_ID)
-        if channel:
-            await channel.send(kill_message)
-        else:
-            await ctx.send(kill_message)
+        kill_announcer.notify(current_game().name)
         await ctx.respond(f"{player_name} has been eliminated! (kill ID: {kill_id})")
 
     @commands.slash_command(guild_ids=GUILD_IDS, name="admin-undo-last-kill", description="(admin) Undoes last kill in the game")
     @discord.default_permissions(administrator=True)
     @option("are_you_really_sure", description="YES/NO (this action is irreversible!)")
+    @instrument_command
+    @in_game
     async def admin_undo_last_kill(self, ctx: discord.ApplicationContext, are_you_really_sure: str):
         if are_you_really_sure != "YES":
             await ctx.respond(f"you're not sure enough about this!, say YES or NO", ephemeral=True)
             return
 
-        kill_info = undo_last_kill()
+        kill_info = await db.undo_last_kill()
         if kill_info is None:
             await ctx.respond(f"No kills left to undo!", ephemeral=True)
             return
@@ -108,18 +127,55 @@ class Admin(commands.Cog):
     @discord.default_permissions(administrator=True)
     @option("rollback_id", type=int, description="Kill ID to rollback to")
     @option("are_you_really_sure", description="YES/NO (this action is irreversible!)")
+    @instrument_command
+    @deferred(ephemeral=True)
+    @in_game
     async def admin_rollback_kills(self, ctx: discord.ApplicationContext, rollback_id: int, are_you_really_sure: str):
         if are_you_really_sure != "YES":
             await ctx.respond(f"you're not sure enough about this!, say YES or NO", ephemeral=True)
             return
 
-        reversed_kills = roll_back_kills_to_id(rollback_id)
-        await ctx.respond(f"{reversed_kills} kills have been rolled back")
+        reversed_kills, changes = await db.roll_back_kills_to_id(rollback_id)
+        await ctx.respond(f"{reversed_kills} kills have been rolled back ({len(changes)} target assignments changed)")
+
+    @commands.slash_command(guild_ids=GUILD_IDS, name="admin-preview-rollback", description="(admin) Preview the target changes of a rollback without applying it")
+    @discord.default_permissions(administrator=True)
+    @option("rollback_id", type=int, description="Kill ID to rollback to")
+    @instrument_command
+    @deferred(ephemeral=True)
+    @in_game
+    async def admin_preview_rollback(self, ctx: discord.ApplicationContext, rollback_id: int):
+        reversed_kills, changes = await db.roll_back_kills_to_id(rollback_id, dry_run=True)
+        lines = []
+        for change in changes:
+            if sum(len(line) + 1 for line in lines) > 1700:
+                lines.append(f"... and {len(changes) - len(lines)} more")
+                break
+            lines.append(str(change))
+        change_list = '\n'.join(lines)
+        await ctx.respond(f"Rolling back to {rollback_id} would undo {reversed_kills} kills:\n```\n{TARGET_CHANGE.HEADER.upper()}\n{change_list}\n```", ephemeral=True)
+
+    @commands.slash_command(guild_ids=GUILD_IDS, name="admin-list-snapshots", description="(admin) List the stored game state snapshots")
+    @discord.default_permissions(administrator=True)
+    @instrument_command
+    @in_game
+    async def admin_list_snapshots(self, ctx: discord.ApplicationContext):
+        snapshots = await db.get_snapshots()
+        if not snapshots:
+            await ctx.respond("No snapshots have been taken yet.", ephemeral=True)
+            return
+        # Most recent snapshots first, they are the likeliest restore points
+        lines = [str(snapshot) for snapshot in reversed(snapshots[-40:])]
+        snapshot_list = '\n'.join(lines)
+        await ctx.respond(f"{len(snapshots)} snapshot(s), one every {SNAPSHOT_INTERVAL} kills:\n```\n{SNAPSHOT.HEADER.upper()}\n{snapshot_list}\n```", ephemeral=True)
 
     @commands.slash_command(guild_ids=GUILD_IDS, name="admin-ingest-csv", description="(admin) Add initial game data from CSV")
     @discord.default_permissions(administrator=True)
     @option("are_you_really_sure", description="YES/NO (this action is irreversible!)", )
     @option("m_id", description="Message ID")
+    @instrument_command
+    @deferred(ephemeral=True)
+    @in_game
     async def admin_ingest_csv(self, ctx: discord.ApplicationContext, message_id: str, are_you_really_sure: str):
         if are_you_really_sure != "YES":
             await ctx.respond(f"you're not sure enough about this!, say YES or NO", ephemeral=True)
@@ -127,26 +183,59 @@ class Admin(commands.Cog):
         try:
             message = await ctx.fetch_message(int(message_id))
             attachment = await message.attachments[0].read()
-            with open(f'./data/{message_id}.csv', 'wb') as f:
-                f.write(attachment)
+            await asyncio.to_thread(_save_attachment, f'./data/{message_id}.csv', attachment)
 
-            con = create_db_connection()
-            add_initial_data(con, f'./data/{message_id}.csv')
-            await ctx.respond(f"Game data has been retrieved from {message_id}")
-        except:
+            player_count = await db.add_initial_data(f'./data/{message_id}.csv')
+            await ctx.respond(f"Game data for {player_count} players has been retrieved from {message_id}")
+        except RosterError as err:
+            problem_list = '\n'.join(err.problems[:20])
+            more = f"\n... and {len(err.problems) - 20} more" if len(err.problems) > 20 else ""
+            await ctx.respond(f"Nothing was ingested, found {len(err.problems)} problem(s) in the CSV:\n```\n{problem_list}{more}\n```", ephemeral=True)
+        except Exception as err:
+            error(f"Ingesting {message_id} failed: {type(err)=} {str(err)=}")
+            await ctx.respond("Something went wrong with this....", ephemeral=True)
+
+    @commands.slash_command(guild_ids=GUILD_IDS, name="admin-generate-targets", description="(admin) Add initial game data from a CSV without targets, assigning them randomly")
+    @discord.default_permissions(administrator=True)
+    @option("are_you_really_sure", description="YES/NO (this action is irreversible!)", )
+    @option("message_id", description="Message ID of a CSV with Discord ID, Name, Group, Secret Word columns")
+    @option("avoid_same_group", type=bool, description="Keep players from targeting their own group where possible", default=True)
+    @instrument_command
+    @deferred(ephemeral=True)
+    @in_game
+    async def admin_generate_targets(self, ctx: discord.ApplicationContext, message_id: str, are_you_really_sure: str, avoid_same_group: bool = True):
+        if are_you_really_sure != "YES":
+            await ctx.respond(f"you're not sure enough about this!, say YES or NO", ephemeral=True)
+            return
+        try:
+            message = await ctx.fetch_message(int(message_id))
+            attachment = await message.attachments[0].read()
+            await asyncio.to_thread(_save_attachment, f'./data/{message_id}.csv', attachment)
+
+            player_count, same_group = await db.add_generated_data(f'./data/{message_id}.csv', avoid_same_group)
+            same_group_note = f", {same_group} of them target someone from their own group" if same_group else ""
+            await ctx.respond(f"Game data for {player_count} players has been retrieved from {message_id} and targets assigned{same_group_note}")
+        except RosterError as err:
+            problem_list = '\n'.join(err.problems[:20])
+            more = f"\n... and {len(err.problems) - 20} more" if len(err.problems) > 20 else ""
+            await ctx.respond(f"Nothing was ingested, found {len(err.problems)} problem(s) in the CSV:\n```\n{problem_list}{more}\n```", ephemeral=True)
+        except Exception as err:
+            error(f"Generating targets from {message_id} failed: {type(err)=} {str(err)=}")
             await ctx.respond("Something went wrong with this....", ephemeral=True)
 
     @commands.slash_command(guild_ids=GUILD_IDS, name="admin-delete-game-data", description="(admin) [**DONT TOUCH. BREAK GLASS**] Remove all rows in database")
     @discord.default_permissions(administrator=True)
     @option("are_you_really_sure", description="YES/NO (this action is irreversible!)", )
     @option("actually_sure", description="actually sure?")
+    @instrument_command
+    @deferred(ephemeral=True)
+    @in_game
     async def admin_delete_game_data(self, ctx: discord.ApplicationContext, are_you_really_sure: str, actually_sure: str):
         if are_you_really_sure != "YES" and actually_sure != "YES":
             await ctx.respond(f"you're not sure enough about this!, say YES or NO", ephemeral=True)
             return
         try:
-            con = create_db_connection()
-            delete_all_data(con)
+            await db.delete_all_data()
             await ctx.respond("Done!")
         except:
             await ctx.respond("Something went wrong with this....", ephemeral=True)
@@ -155,15 +244,101 @@ class Admin(commands.Cog):
     @discord.default_permissions(administrator=True)
     @option("player_discord_id", description="The player's discord id")
     @option("new_secret_word", description="The new secret word")
+    @instrument_command
+    @in_game
     async def admin_reset_secret(self, ctx: discord.ApplicationContext, player_discord_id: str, new_secret_word: str):
-        
-        con = create_db_connection()
-        old_secret_word = set_player_secret_word(con, player_discord_id, new_secret_word)
+        try:
+            old_secret_word = await db.set_player_secret_word(player_discord_id, new_secret_word)
+        except ValueError as err:
+            await ctx.respond(str(err), ephemeral=True)
+            return
         if old_secret_word is None:
             await ctx.respond(f"No Player associated with {player_discord_id}", ephemeral=True)
             return
         else:
             await ctx.respond(f"{player_discord_id}'s secret word has been changed to ||{new_secret_word}|| (from ||{old_secret_word}||)", ephemeral=True)
 
+    @commands.slash_command(guild_ids=GUILD_IDS, name="admin-check-targets", description="(admin) Check the in-memory target ring against the database")
+    @discord.default_permissions(administrator=True)
+    @instrument_command
+    @deferred(ephemeral=True)
+    @in_game
+    async def admin_check_targets(self, ctx: discord.ApplicationContext):
+        problems = await db.find_state_problems()
+        if not problems:
+            await ctx.respond("Target ring matches the database.", ephemeral=True)
+            return
+        problem_list = '\n'.join(problems[:20])
+        await ctx.respond(f"Found {len(problems)} problem(s):\n```\n{problem_list}\n```", ephemeral=True)
+
+    @commands.slash_command(guild_ids=GUILD_IDS, name="admin-verify-journal", description="(admin) Replay the event journal and compare it with the game tables")
+    @discord.default_permissions(administrator=True)
+    @instrument_command
+    @deferred(ephemeral=True)
+    @in_game
+    async def admin_verify_journal(self, ctx: discord.ApplicationContext):
+        problems = await db.find_journal_problems()
+        if not problems:
+            await ctx.respond("Event journal matches the game tables.", ephemeral=True)
+            return
+        problem_list = '\n'.join(problems[:20])
+        await ctx.respond(f"Found {len(problems)} problem(s):\n```\n{problem_list}\n```", ephemeral=True)
+
+    @commands.slash_command(guild_ids=GUILD_IDS, name="admin-create-game", description="(admin) Start a new game with its own database in this server")
+    @discord.default_permissions(administrator=True)
+    @option("name", description="Name of the game, e.g. spring-2025 or practice")
+    @option("kill_channel", type=discord.TextChannel, description="Channel to announce kills in (default: this channel)", required=False)
+    @instrument_command
+    @deferred(ephemeral=True)
+    async def admin_create_game(self, ctx: discord.ApplicationContext, name: str, kill_channel: discord.TextChannel = None):
+        kill_channel_id = kill_channel.id if kill_channel is not None else ctx.channel_id
+        try:
+            game = await game_router.create_game(name.strip().lower(), ctx.guild_id, kill_channel_id)
+        except ValueError as err:
+            await ctx.respond(str(err), ephemeral=True)
+            return
+        await ctx.respond(f"Started {game.name}, kills will be announced in <#{kill_channel_id}>. Add players with `/admin-ingest-csv` or `/admin-generate-targets`.", ephemeral=True)
+
+    @commands.slash_command(guild_ids=GUILD_IDS, name="admin-archive-game", description="(admin) Archive this server's game, keeping its data")
+    @discord.default_permissions(administrator=True)
+    @option("name", description="Name of the game to archive")
+    @option("are_you_really_sure", description="YES/NO (players can't use the game anymore!)")
+    @instrument_command
+    async def admin_archive_game(self, ctx: discord.ApplicationContext, name: str, are_you_really_sure: str):
+        if are_you_really_sure != "YES":
+            await ctx.respond(f"you're not sure enough about this!, say YES or NO", ephemeral=True)
+            return
+        if not await game_router.archive_game(name.strip().lower(), ctx.guild_id):
+            await ctx.respond(f"{name} is not the game running in this server", ephemeral=True)
+            return
+        await ctx.respond(f"Archived {name}. Start the next one with `/admin-create-game`.", ephemeral=True)
+
+    @commands.slash_command(guild_ids=GUILD_IDS, name="admin-list-games", description="(admin) List this server's games")
+    @discord.default_permissions(administrator=True)
+    @instrument_command
+    async def admin_list_games(self, ctx: discord.ApplicationContext):
+        games = await game_router.list_games(ctx.guild_id)
+        if not games:
+            await ctx.respond("No games have been played in this server.", ephemeral=True)
+            return
+        game_list = '\n'.join(str(game) for game in games)
+        await ctx.respond(f"{len(games)} game(s):\n```\n{GAME.HEADER.upper()}\n{game_list}\n```", ephemeral=True)
+
+    @commands.slash_command(guild_ids=GUILD_IDS, name="admin-cache-stats", description="(admin) Show stat response cache hit/miss counters")
+    @discord.default_permissions(administrator=True)
+    @instrument_command
+    async def admin_cache_stats(self, ctx: discord.ApplicationContext):
+        stats = response_cache.stats()
+        lookups = stats['hits'] + stats['misses']
+        hit_rate = 100 * stats['hits'] / lookups if lookups else 0.0
+        stat_lines = '\n'.join(f"{name:<15}{value}" for name, value in stats.items())
+        await ctx.respond(f"```\n{stat_lines}\n{'hit_rate':<15}{hit_rate:.1f}%\n```", ephemeral=True)
+
+    @commands.slash_command(guild_ids=GUILD_IDS, name="admin-metrics", description="(admin) Summarize command and database latency, SQLite busy errors and event loop lag")
+    @discord.default_permissions(administrator=True)
+    @instrument_command
+    async def admin_metrics(self, ctx: discord.ApplicationContext):
+        await ctx.respond(f"```\n{metrics_summary()[:1900]}\n```", ephemeral=True)
+
 def setup(bot):
     bot.add_cog(Admin(bot))
\ No newline at end of file
@@ -1,6 +1,10 @@
 
 from config import GUILD_IDS, YOU_HAVE_NO_ENEMIES
 from database import *
+from games import db, game_router, current_game, in_game, playing
+from response_cache import response_cache
+from metrics import instrument_command
+from deferral import deferred
 from discord.ext import commands
 from discord import Permissions, TextChannel
 from discord.commands import option
@@ -8,71 +12,141 @@ from discord.utils import get
 from datetime import datetime
 from model import *
 import discord
-
-
-def _split_lines(lines, N):
-    assert N > 1000
-
-    chunk = ""
-    chunks = []
-    
-    for line in lines:
-        if len(chunk) + len(line) + 1 > N:
-            chunks.append(chunk)
-            chunk = ''
-        chunk += line + '\n'
-
-    chunks.append(chunk)
-
-    return chunks
-
-def _table_to_message(table_data, header) -> list[str]:
-    table_data = [str(d) for d in table_data]
-    chunks = _split_lines(table_data, 1875)
-    messages = [f"```\n{header.upper()}\n{chunk}\n```" for chunk in chunks]
-    return messages
+import functools
+
+
+class TablePages(discord.ui.View):
+    """Shows a table one page at a time with previous/next buttons.
+
+    Pages are fetched only when asked for. `fetch_page(after, before, limit)` returns
+    up to `limit` (cursor, row) pairs in table order, starting right after the cursor
+    `after` or ending right before `before`, both None for the first page. The table
+    belongs to the game current when it is created.
+    """
+    def __init__(self, header: str, fetch_page, cache_key: tuple, page_size: int = PAGE_SIZE):
+        super().__init__(timeout=600, disable_on_timeout=True)
+        self.game = current_game()
+        self.header = header
+        self.fetch_page = fetch_page
+        self.cache_key = cache_key
+        self.page_size = page_size
+        self.first_cursor = None
+        self.last_cursor = None
+
+    async def _fetch(self, after, before) -> list[tuple]:
+        key = (self.game.name, *self.cache_key, after, before)
+        version = self.game.db.state_version()
+        if (rows := response_cache.get(key, version)) is None:
+            # One extra row tells whether there is another page beyond this one
+            rows = await self.fetch_page(after, before, self.page_size + 1)
+            response_cache.put(key, version, rows)
+        return rows
+
+    async def render(self, after=None, before=None) -> str:
+        """Fetches the page after/before a cursor, updates the buttons and returns the message."""
+        rows = await self._fetch(after, before)
+        if not rows and (after is not None or before is not None):
+            # The rows around the cursor are gone (e.g. kills were undone), start over
+            return await self.render()
+
+        more = len(rows) > self.page_size
+        if before is not None:
+            rows = rows[-self.page_size:]
+            has_previous, has_next = more, True
+        else:
+            rows = rows[:self.page_size]
+            has_previous, has_next = after is not None, more
+
+        if rows:
+            self.first_cursor, self.last_cursor = rows[0][0], rows[-1][0]
+        self.previous_page.disabled = not has_previous
+        self.next_page.disabled = not has_next
+        lines = '\n'.join(str(row) for _, row in rows)
+        return f"```\n{self.header.upper()}\n{lines}\n```"
+
+    async def _turn_page(self, interaction: discord.Interaction, after=None, before=None):
+        # `fetch_page` is bound to the game's connections, which are gone if it was archived or closed while idle
+        if await game_router.open_game(self.game.name) is not self.game:
+            await interaction.response.edit_message(content="This table is out of date, run the command again.", view=None)
+            return
+        with playing(self.game):
+            await interaction.response.edit_message(content=await self.render(after, before), view=self)
+
+    @discord.ui.button(label="Previous", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, button: discord.ui.Button, interaction: discord.Interaction):
+        await self._turn_page(interaction, before=self.first_cursor)
+
+    @discord.ui.button(label="Next", style=discord.ButtonStyle.secondary)
+    async def next_page(self, button: discord.ui.Button, interaction: discord.Interaction):
+        await self._turn_page(interaction, after=self.last_cursor)
+
+def _keyset_pages(fetch, cursor):
+    """Adapts a `db.get_*_page` coroutine to `TablePages`, `cursor(row)` being the row's keyset value."""
+    async def fetch_page(after, before, limit):
+        return [(cursor(row), row) for row in await fetch(after_id=after, before_id=before, limit=limit)]
+    return fetch_page
+
+def _ranked_pages(fetch_range):
+    """Adapts a coroutine `fetch_range(start, stop)` returning a slice of a ranking to `TablePages`.
+
+    Cursors are positions in the ranking. Each page calls `fetch_range` again, which for
+    the date rankings re-aggregates `daily_kills` over the whole range to slice it.
+    """
+    async def fetch_page(after, before, limit):
+        if before is not None:
+            start, stop = max(0, before - limit), before
+        else:
+            start = 0 if after is None else after + 1
+            stop = start + limit
+        return list(enumerate(await fetch_range(start, stop), start))
+    return fetch_page
+
+async def _respond_pages(ctx: discord.ApplicationContext, header: str, fetch_page, cache_key: tuple, ephemeral: bool = False):
+    view = TablePages(header, fetch_page, cache_key)
+    await ctx.respond(await view.render(), view=view, ephemeral=ephemeral)
+
+_to_key_date = lambda d : d.strftime("%Y-%m-%d") if d else None
 
 class Stat(commands.Cog):
     def __init__(self, bot: discord.Bot):
         self.bot = bot
 
     @commands.slash_command(guild_ids=GUILD_IDS, name="stat-all-kills", description="(stat) Get all kills")
+    @instrument_command
+    @deferred()
+    @in_game
     async def all_kills(self, ctx: discord.ApplicationContext):
-        con = create_db_connection()
-        
-        kills = get_all_kills(con)
-
-        kill_messages = _table_to_message(kills, KILL_ENTRY.HEADER)
-        await ctx.respond(kill_messages[0])
-        for m in kill_messages[1:]:
-            await ctx.send(m)
+        await _respond_pages(ctx, KILL_ENTRY.HEADER, _keyset_pages(db.get_kills_page, lambda kill: kill.id),
+                             ("stat-all-kills",))
 
     @commands.slash_command(guild_ids=GUILD_IDS, name="stat-daily-kills", description="(stat)(admin) Get kills from today")
     @option(name='date', description="(optional) provide a specific date (YYYY-MM-DD)", required=False)
     @discord.default_permissions(administrator=True)
+    @instrument_command
+    @deferred()
+    @in_game
     async def daily_kills(self, ctx: discord.ApplicationContext, date: str = ''):
-        con = create_db_connection()
         try:
             if date.strip() == '': 
-                date = datetime.now()
+                date = game_now()
             else:
                 date = datetime.strptime(date, '%Y-%m-%d')
         except:
             await ctx.respond(f"ERROR: you must provide valid date in YYYY-MM-DD format (no spaces!)", ephemeral=True)
             return
 
-        kills = get_kills_on_date(con, date)
-        kill_messages = _table_to_message(kills, KILL_ENTRY.HEADER)
-        await ctx.respond(kill_messages[0])
-        for m in kill_messages[1:]:
-            await ctx.send(m)
+        fetch = functools.partial(db.get_kills_page, start_date=date, end_date=date)
+        await _respond_pages(ctx, KILL_ENTRY.HEADER, _keyset_pages(fetch, lambda kill: kill.id),
+                             ("stat-daily-kills", _to_key_date(date)))
 
     @commands.slash_command(guild_ids=GUILD_IDS, name="stat-weekly-kills", description="(stat)(admin) Get all kills between dates")
     @option(name='start_date', description="(optional) provide a specific date (YYYY-MM-DD)", required=True)
     @option(name='end_date', description="(optional) provide a specific date (YYYY-MM-DD)", required=False)
     @discord.default_permissions(administrator=True)
+    @instrument_command
+    @deferred()
+    @in_game
     async def weekly_kills(self, ctx: discord.ApplicationContext, start_date: str, end_date: str = ""):
-        con = create_db_connection()
         try:
             start_date = datetime.strptime(start_date.strip(), '%Y-%m-%d')
             end_date = None if end_date.strip() == '' else datetime.strptime(end_date.strip(), '%Y-%m-%d')
@@ -80,30 +154,25 @@ class Stat(commands.Cog):
             await ctx.respond(f"ERROR: you must provide valid date in YYYY-MM-DD format (no spaces!)", ephemeral=True)
             return
 
-        kills = get_kills_between_dates(con, start_date, end_date)
-        kill_messages = _table_to_message(kills, KILL_ENTRY.HEADER)
-        await ctx.respond(kill_messages[0])
-        for m in kill_messages[1:]:
-            await ctx.send(m)
+        fetch = functools.partial(db.get_kills_page, start_date=start_date, end_date=end_date)
+        await _respond_pages(ctx, KILL_ENTRY.HEADER, _keyset_pages(fetch, lambda kill: kill.id),
+                             ("stat-weekly-kills", _to_key_date(start_date), _to_key_date(end_date)))
     
 
     @commands.slash_command(guild_ids=GUILD_IDS, name="stat-top-kills", description="(stat) Get a rollup of overall top players ordered by their kill count")
+    @instrument_command
+    @in_game
     async def top_kills(self, ctx: discord.ApplicationContext):
-        con = create_db_connection()
-
-        kill_summary = get_top_kills(con)
-        messages = _table_to_message(kill_summary, KILL_SUMMARY.HEADER)
-
-        await ctx.respond(messages[0])
-        for m in messages[1:]:
-            await ctx.send(m)
+        await _respond_pages(ctx, KILL_SUMMARY.HEADER, _ranked_pages(db.get_leaderboard), ("stat-top-kills",))
 
     @commands.slash_command(guild_ids=GUILD_IDS, name="stat-top-weekly-kills", description="(stat)(admin) Get a list of top players between dates")
     @option(name='start_date', description="(optional) provide a specific date (YYYY-MM-DD)", required=True)
     @option(name='end_date', description="(optional) provide a specific date (YYYY-MM-DD)", required=False)
     @discord.default_permissions(administrator=True)
+    @instrument_command
+    @deferred()
+    @in_game
     async def top_weekly_kills(self, ctx: discord.ApplicationContext, start_date: str, end_date: str = ""):
-        con = create_db_connection()
         try:
             start_date = datetime.strptime(start_date.strip(), '%Y-%m-%d')
             end_date = None if end_date.strip() == '' else datetime.strptime(end_date.strip(), '%Y-%m-%d')
@@ -111,60 +180,58 @@ class Stat(commands.Cog):
             await ctx.respond(f"ERROR: you must provide valid date in YYYY-MM-DD format (no spaces!)", ephemeral=True)
             return
 
-        kill_summary = get_top_kills_between_dates(con, start_date, end_date)
-        messages = _table_to_message(kill_summary, KILL_SUMMARY.HEADER)
-        await ctx.respond(messages[0])
-        for m in messages[1:]:
-            await ctx.send(m)
+        async def fetch_range(start: int, stop: int):
+            return (await db.get_top_kills_between_dates(start_date, end_date))[start:stop]
+        await _respond_pages(ctx, KILL_SUMMARY.HEADER, _ranked_pages(fetch_range),
+                             ("stat-top-weekly-kills", _to_key_date(start_date), _to_key_date(end_date)))
 
     @commands.slash_command(guild_ids=GUILD_IDS, name="stat-top-daily-kills", description="(stat)(admin) Get a list of top players on a date (defualt today)")
     @option(name='date', description="(optional) provide a specific date (YYYY-MM-DD)", required=False)
     @discord.default_permissions(administrator=True)
+    @instrument_command
+    @deferred()
+    @in_game
     async def top_daily_kills(self, ctx: discord.ApplicationContext, date: str = ''):
-        con = create_db_connection()
         try:
             if date.strip() == '': 
-                date = datetime.now()
+                date = game_now()
             else:
                 date = datetime.strptime(date, '%Y-%m-%d')
         except:
             await ctx.respond(f"ERROR: you must provide valid date in YYYY-MM-DD format (no spaces!)", ephemeral=True)
             return
 
-        kills = get_top_kills_on_date(con, date)
-        messages = _table_to_message(kills, KILL_SUMMARY.HEADER)
-
-        await ctx.respond(messages[0])
-        for m in messages[1:]:
-            await ctx.send(m)
+        async def fetch_range(start: int, stop: int):
+            return (await db.get_top_kills_on_date(date))[start:stop]
+        await _respond_pages(ctx, KILL_SUMMARY.HEADER, _ranked_pages(fetch_range),
+                             ("stat-top-daily-kills", _to_key_date(date)))
 
     @commands.slash_command(guild_ids=GUILD_IDS, name="stat-active-players", description="(stat) Get a list of all uneliminated players")
+    @instrument_command
+    @deferred()
+    @in_game
     async def active_players(self, ctx: discord.ApplicationContext):
-        con = create_db_connection()
-        player_summary = get_all_players(con, active_players_only=True)
-        messages = _table_to_message(player_summary, PLAYER.HEADER)
-        await ctx.respond(messages[0])
-        for m in messages[1:]:
-            await ctx.send(m)
+        fetch = functools.partial(db.get_players_page, active_players_only=True)
+        await _respond_pages(ctx, PLAYER.HEADER, _keyset_pages(fetch, lambda player: player.player_id),
+                             ("stat-active-players",))
 
     @commands.slash_command(guild_ids=GUILD_IDS, name="stat-all-players", description="(stat) Get a list of all player and their elimination status.")
+    @instrument_command
+    @deferred()
+    @in_game
     async def all_players(self, ctx: discord.ApplicationContext):
-        con = create_db_connection()
-        player_summary = get_all_players(con)
-        messages = _table_to_message(player_summary, PLAYER.HEADER)
-        await ctx.respond(messages[0])
-        for m in messages[1:]:
-            await ctx.send(m)
+        await _respond_pages(ctx, PLAYER.HEADER, _keyset_pages(db.get_players_page, lambda player: player.player_id),
+                             ("stat-all-players",))
 
     @commands.slash_command(guild_ids=GUILD_IDS, name="stat-target-assignments", description="(stat)(admin) Get a list of all target assignments")
     @discord.default_permissions(administrator=True)
+    @instrument_command
+    @deferred(ephemeral=True)
+    @in_game
     async def all_target_assignments(self, ctx: discord.ApplicationContext):
-        con = create_db_connection()
-        assignment_summary = get_target_assignments(con)
-        messages = _table_to_message(assignment_summary, TARGET_ASSIGNMENT.HEADER)
-        await ctx.respond(messages[0], ephemeral=True)
-        for m in messages[1:]:
-            await ctx.send(m)
+        await _respond_pages(ctx, TARGET_ASSIGNMENT.HEADER,
+                             _keyset_pages(db.get_target_assignments_page, lambda assignment: assignment.player_id),
+                             ("stat-target-assignments",), ephemeral=True)
 
 def setup(bot):
     bot.add_cog(Stat(bot))
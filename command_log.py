@@ -0,0 +1,174 @@
+# Module recording one structured JSON event per slash command invocation
+#
+# Summarize a log offline with:
+#   python command_log.py command_log.jsonl
+import argparse
+import json
+import math
+import sys
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Iterable
+
+from logger import log_json
+
+class CommandTiming:
+    """Time spent by one command invocation, accumulated as it awaits the database and discord."""
+    __slots__ = ("started", "finished", "ack_seconds", "db_seconds", "db_wait_seconds", "db_calls", "discord_seconds", "discord_calls")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.finished: float | None = None
+        # Seconds from the interaction being created to it being deferred, for deferred commands
+        self.ack_seconds: float | None = None
+        self.db_seconds = 0.0
+        self.db_wait_seconds = 0.0
+        self.db_calls = 0
+        self.discord_seconds = 0.0
+        self.discord_calls = 0
+
+_current_timing: ContextVar[CommandTiming | None] = ContextVar("command_timing", default=None)
+
+def record_db_call(seconds: float, wait_seconds: float = 0.0):
+    """Adds a database call to the running command, if any.
+
+    Args:
+        seconds: total time awaited
+        wait_seconds: part of it spent queued for a thread or connection
+    """
+    if (timing := _current_timing.get()) is not None:
+        timing.db_seconds += seconds
+        timing.db_wait_seconds += wait_seconds
+        timing.db_calls += 1
+
+def record_ack(seconds: float):
+    """Records how long after its interaction was created the running command acknowledged it."""
+    if (timing := _current_timing.get()) is not None:
+        timing.ack_seconds = seconds
+
+def _timed_discord(request):
+    async def timed_request(*args, **kwargs):
+        if (timing := _current_timing.get()) is None:
+            return await request(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return await request(*args, **kwargs)
+        finally:
+            timing.discord_seconds += time.perf_counter() - start
+            timing.discord_calls += 1
+    return timed_request
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 2)
+
+def _write_event(ctx, outcome: str, err: Exception | None = None):
+    if (timing := _current_timing.get()) is None:
+        return
+    finished = timing.finished or time.perf_counter()
+    event: dict[str, Any] = {
+        "ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+        "command": ctx.command.qualified_name if ctx.command else None,
+        "user": ctx.author.name if ctx.author else None,
+        "guild": ctx.guild_id,
+        "outcome": outcome,
+        "total_ms": _ms(finished - timing.started),
+        "db_ms": _ms(timing.db_seconds),
+        "db_wait_ms": _ms(timing.db_wait_seconds),
+        "db_calls": timing.db_calls,
+        "discord_ms": _ms(timing.discord_seconds),
+        "discord_calls": timing.discord_calls,
+    }
+    if timing.ack_seconds is not None:
+        event["ack_ms"] = _ms(timing.ack_seconds)
+    if err is not None:
+        original = getattr(err, "original", err)
+        event["error"] = type(original).__name__
+    log_json(event)
+
+def install(bot):
+    """Starts recording an event for every slash command `bot` runs.
+
+    Times discord API calls made through the bot's HTTP client and interaction
+    responses. Events are only written if `logger.configure` was given an event log.
+    """
+    from discord.webhook.async_ import async_context
+
+    bot.http.request = _timed_discord(bot.http.request)
+    adapter = async_context.get()
+    adapter.request = _timed_discord(adapter.request)
+
+    @bot.before_invoke
+    async def start_timing(ctx):
+        _current_timing.set(CommandTiming())
+
+    @bot.after_invoke
+    async def stop_timing(ctx):
+        if (timing := _current_timing.get()) is not None:
+            timing.finished = time.perf_counter()
+
+    async def on_completion(ctx):
+        _write_event(ctx, "ok")
+
+    async def on_error(ctx, err: Exception):
+        _write_event(ctx, "error", err)
+
+    bot.add_listener(on_completion, "on_application_command_completion")
+    bot.add_listener(on_error, "on_application_command_error")
+
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    """Nearest-rank percentile of already sorted values."""
+    rank = math.ceil(p / 100 * len(sorted_values))
+    return sorted_values[max(0, rank - 1)]
+
+def summarize(events: Iterable[dict[str, Any]], field: str = "total_ms") -> list[tuple]:
+    """Groups events by command.
+
+    Returns:
+        (command, count, errors, p50, p95, p99, max) of `field` per command, slowest p95 first
+    """
+    values: dict[str, list[float]] = defaultdict(list)
+    errors: dict[str, int] = defaultdict(int)
+    for event in events:
+        if field not in event:
+            continue
+        command = event.get("command") or "?"
+        values[command].append(event[field])
+        errors[command] += event.get("outcome") != "ok"
+
+    rows = []
+    for command, samples in values.items():
+        samples.sort()
+        rows.append((command, len(samples), errors[command], percentile(samples, 50),
+                     percentile(samples, 95), percentile(samples, 99), samples[-1]))
+    rows.sort(key=lambda row: row[4], reverse=True)
+    return rows
+
+def _read_events(path: str) -> Iterable[dict[str, Any]]:
+    with open(path, encoding="utf-8") as log_file:
+        for line_number, line in enumerate(log_file, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                print(f"skipping malformed line {line_number}", file=sys.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description="Print per-command latency percentiles from a command log")
+    parser.add_argument("log", nargs="+", help="JSON-lines command log file(s)")
+    parser.add_argument("--field", default="total_ms",
+                        help="latency field to summarize, e.g. total_ms, ack_ms, db_ms, db_wait_ms or discord_ms")
+    args = parser.parse_args()
+
+    events = (event for path in args.log for event in _read_events(path))
+    rows = summarize(events, args.field)
+    print(f"{'command':<28}{'count':>8}{'errors':>8}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}   ({args.field})")
+    for command, count, errors, p50, p95, p99, slowest in rows:
+        print(f"{command:<28}{count:>8}{errors:>8}{p50:>10.1f}{p95:>10.1f}{p99:>10.1f}{slowest:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
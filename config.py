@@ -10,11 +10,30 @@ TOKEN = os.environ['TOKEN']
 # Sockwars server guild id
 GUILD_ID = int(os.environ['GUILD_ID'])
 
+# (optional) Comma separated ids of more guilds to serve, each runs its own game (see games.py)
+EXTRA_GUILD_IDS = [int(guild_id) for guild_id in os.environ.get('EXTRA_GUILD_IDS', '').split(',') if guild_id.strip()]
+
 # Convenience variable...
-GUILD_IDS = [GUILD_ID]
+GUILD_IDS = [GUILD_ID] + EXTRA_GUILD_IDS
 ERROR_CHANNEL_ID = int(os.environ['ERROR_CHANNEL_ID'])
 KILL_CHANNEL_ID = int(os.environ['KILL_CHANNEL_ID'])
 
+# (optional) Timezone deciding which day a kill counts towards, e.g. US/Pacific. Defaults to the server's local time
+GAME_TIMEZONE = os.environ.get('GAME_TIMEZONE', '').strip()
+
+# (optional) Lowest level written to the console and log files: DEBUG (default), INFO or ERROR
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'DEBUG').strip() or 'DEBUG'
+# (optional) Log files roll over once they reach this size or age, keeping LOG_BACKUP_COUNT old files
+LOG_MAX_MB = float(os.environ.get('LOG_MAX_MB') or 10)
+LOG_ROTATE_HOURS = float(os.environ.get('LOG_ROTATE_HOURS') or 24)
+LOG_BACKUP_COUNT = int(os.environ.get('LOG_BACKUP_COUNT') or 5)
+# (optional) JSON-lines file receiving one latency event per slash command, e.g. command_log.jsonl
+COMMAND_LOG = os.environ.get('COMMAND_LOG', '').strip()
+# (optional) Serve Prometheus metrics on http://127.0.0.1:<METRICS_PORT>/metrics, disabled if unset
+METRICS_PORT = int(os.environ.get('METRICS_PORT') or 0)
+# (optional) Close a game's database connections after this many minutes without commands (default 30)
+GAME_IDLE_MINUTES = float(os.environ.get('GAME_IDLE_MINUTES') or 30)
+
 YOU_HAVE_NO_ENEMIES="https://imgur.com/F628Puf"
 ITS_JOEVER='https://imgur.com/7tk1NT8'
 
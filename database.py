@@ -1,37 +1,113 @@
 import sqlite3
-import csv
-from datetime import datetime
-from typing import Literal
+import itertools
+import os
+import random
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Iterator, Literal
 from logger import info, debug, error
+from pytz import timezone as pytz_timezone, utc
 
 from model import *
+from journal import EVENT, ReplayState, append_event, append_events, find_journal_problems, replay
+from snapshots import SNAPSHOT_INTERVAL, assignment_changes_since, delete_snapshots_after, get_snapshots, take_snapshot
+from roster import BARE_ROSTER_COLUMNS, INGEST_BATCH_SIZE, RosterError, RosterValidator, generate_target_cycle, group_key, read_roster
 
-DATABASE_PATH = './data/sockwars.db'
+if TYPE_CHECKING:
+    from state import GameState
 
-def ingest_csv(filename: str) -> list[tuple[str]]:
-    """ Returns the CSV data from `filename` in the right format to insert to sqlite3
+# Overridable through the environment, e.g. to point a load test at a scratch database
+DATABASE_PATH = os.environ.get('SOCKBOT_DATABASE_PATH', './data/sockwars.db')
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Timezone that decides which day a kill counts towards, None for the server's local time
+_game_timezone = None
+
+def set_game_timezone(name: str | None):
+    """Sets the timezone used for kill dates, e.g. 'US/Pacific'. None uses the server's local time.
 
-    Args:
-        filename: filepath to csv data.
-    
-    Returns:
-        List of tuples with the csv row data.
-    
     Raises:
-        OSError: if file does not exist.
+        pytz.UnknownTimeZoneError: if `name` is not a valid timezone
     """
-    with open(filename, 'r') as csvfile:
-        reader = csv.reader(csvfile, delimiter=',')
-        data = [tuple(row) for row in list(reader)[1:]]
-        return data
-
-def db_setup(con: sqlite3.Connection):
-    """Sets up SQLite Database tables (if they don't exist already).
+    global _game_timezone
+    _game_timezone = pytz_timezone(name) if name else None
+
+def get_game_timezone_name() -> str:
+    return _game_timezone.zone if _game_timezone is not None else 'localtime'
+
+def to_game_time(timestamp: datetime) -> datetime:
+    """Converts an aware (or naive UTC) datetime to naive game-local time."""
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    if _game_timezone is None:
+        return timestamp.astimezone().replace(tzinfo=None)
+    return timestamp.astimezone(_game_timezone).replace(tzinfo=None)
+
+def game_now() -> datetime:
+    """Returns the current naive game-local time."""
+    return to_game_time(datetime.now(utc))
+
+def _parse_timestamp(timestamp: str) -> datetime:
+    """Parses a kill_log UTC timestamp into naive game-local time."""
+    return to_game_time(datetime.strptime(timestamp, TIMESTAMP_FORMAT))
+
+# Per-connection tuning applied by `create_db_connection`
+CONNECTION_PRAGMAS = {
+    "synchronous": "NORMAL",
+    "cache_size": -16000,       # KiB, i.e. ~16MB of page cache per connection
+    "mmap_size": 67108864,      # 64MB memory-mapped I/O
+    "temp_store": "MEMORY",
+}
+
+@contextmanager
+def transaction(con: sqlite3.Connection) -> Iterator[sqlite3.Connection]:
+    """Runs the body of a `with` block as a single transaction.
+
+    Commits on success and rolls back if an exception is raised. If `con` is already
+    inside a transaction, the block runs in a SAVEPOINT instead so only its own
+    changes are rolled back on error and the outer transaction decides when to commit.
 
     Args:
         con: sqlite Database connection
     """
-    cur = con.cursor()
+    if con.in_transaction:
+        savepoint = f"sp_{next(_savepoint_ids)}"
+        con.execute(f"SAVEPOINT {savepoint}")
+        try:
+            yield con
+        except BaseException:
+            con.execute(f"ROLLBACK TO {savepoint}")
+            con.execute(f"RELEASE {savepoint}")
+            raise
+        con.execute(f"RELEASE {savepoint}")
+        return
+
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        yield con
+    except BaseException:
+        con.rollback()
+        raise
+    con.commit()
+
+_savepoint_ids = itertools.count()
+
+# Incremented per database file after every write to it, lets caches tell when a game's data changed
+_game_state_versions: dict[str, int] = {}
+_game_state_version_lock = threading.Lock()
+
+def bump_game_state_version(database_path: str):
+    """Marks anything rendered from the game data in `database_path` so far as stale."""
+    with _game_state_version_lock:
+        _game_state_versions[database_path] = _game_state_versions.get(database_path, 0) + 1
+
+def get_game_state_version(database_path: str) -> int:
+    """Returns a counter that changes whenever a write to `database_path` finishes, see `AsyncDatabase`."""
+    return _game_state_versions.get(database_path, 0)
+
+def _migration_1_initial_tables(cur: sqlite3.Cursor):
     cur.execute("""
                 CREATE TABLE IF NOT EXISTS player_info (
                     discord_id TEXT PRIMARY KEY, 
@@ -61,32 +137,326 @@ def db_setup(con: sqlite3.Connection):
                 """)
     debug(f'Created table kill_log successfully.')
 
-def add_initial_data(con: sqlite3.Connection, csv_source_filename: str):
+def _migration_2_lookup_indexes(cur: sqlite3.Cursor):
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_player_info_secret_word ON player_info (secret_word COLLATE NOCASE)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_kill_log_target ON kill_log (target_discord_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_kill_log_player ON kill_log (player_discord_id)")
+
+    # date(timestamp, 'localtime') is not deterministic so it can't be an indexed
+    # expression or generated column; store the local date at insert time instead.
+    cur.execute("ALTER TABLE kill_log ADD COLUMN local_date TEXT")
+    cur.execute("UPDATE kill_log SET local_date = date(timestamp, 'localtime')")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_kill_log_local_date ON kill_log (local_date)")
+    debug(f'Created lookup indexes successfully.')
+
+def _migration_3_kill_log_hunter(cur: sqlite3.Cursor):
+    # The player whose target was reassigned by a kill. In free-for-all games (and
+    # for disqualifications) this differs from kill_log.player_discord_id, and undoing
+    # a kill has to give the victim back to this player.
+    cur.execute("ALTER TABLE kill_log ADD COLUMN hunter_discord_id TEXT")
+
+def _migration_4_game_snapshots(cur: sqlite3.Cursor):
+    cur.execute("""
+                CREATE TABLE IF NOT EXISTS game_snapshots (
+                    kill_id INTEGER PRIMARY KEY,
+                    created_at TEXT NOT NULL DEFAULT current_timestamp,
+                    player_count INTEGER NOT NULL,
+                    assignments BLOB NOT NULL
+                )
+                """)
+    debug(f'Created table game_snapshots successfully.')
+
+def _migration_5_game_events(cur: sqlite3.Cursor):
+    cur.execute("""
+                CREATE TABLE IF NOT EXISTS game_events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    event_type TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    created_at TEXT NOT NULL DEFAULT current_timestamp
+                )
+                """)
+    debug(f'Created table game_events successfully.')
+
+    # Games started before the journal existed get their current state as the first event
+    players = cur.execute("SELECT discord_id, player_name, group_name, secret_word FROM player_info").fetchall()
+    if players:
+        assignments = cur.execute("SELECT player_discord_id, target_discord_id FROM target_assignments").fetchall()
+        kills = cur.execute("SELECT id, target_discord_id, COALESCE(hunter_discord_id, player_discord_id) FROM kill_log").fetchall()
+        append_event(cur.connection, EVENT.BASELINE, {"players": players, "assignments": assignments, "kills": kills})
+
+def _migration_6_player_stats(cur: sqlite3.Cursor):
+    cur.execute("""
+                CREATE TABLE IF NOT EXISTS player_stats (
+                    discord_id TEXT PRIMARY KEY,
+                    kills INTEGER NOT NULL DEFAULT 0,
+                    last_kill_id INTEGER,
+                    last_kill_at TEXT,
+                    eliminated INTEGER NOT NULL DEFAULT 0
+                )
+                """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_player_stats_rank ON player_stats (kills DESC, last_kill_id, discord_id)")
+    refresh_player_stats(cur.connection)
+    debug(f'Created table player_stats successfully.')
+
+def _migration_7_daily_kills(cur: sqlite3.Cursor):
+    cur.execute("""
+                CREATE TABLE IF NOT EXISTS daily_kills (
+                    local_date TEXT NOT NULL,
+                    player_discord_id TEXT NOT NULL,
+                    kills INTEGER NOT NULL,
+                    PRIMARY KEY (local_date, player_discord_id)
+                ) WITHOUT ROWID
+                """)
+    cur.execute("""
+                CREATE TABLE IF NOT EXISTS game_settings (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                )
+                """)
+    cur.execute("INSERT OR REPLACE INTO game_settings (key, value) VALUES ('kill_date_timezone', 'localtime')")
+    _rebuild_daily_kills(cur)
+    debug(f'Created table daily_kills successfully.')
+
+def _migration_8_announcement_outbox(cur: sqlite3.Cursor):
+    cur.execute("""
+                CREATE TABLE IF NOT EXISTS announcement_outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    channel_id INTEGER NOT NULL,
+                    content TEXT NOT NULL,
+                    created_at TEXT NOT NULL DEFAULT current_timestamp
+                )
+                """)
+    debug(f'Created table announcement_outbox successfully.')
+
+# Ordered list of (version, description, migration). Never edit or reorder an
+# applied migration, append a new one instead.
+MIGRATIONS: list[tuple[int, str, Callable[[sqlite3.Cursor], None]]] = [
+    (1, "initial player_info, target_assignments and kill_log tables", _migration_1_initial_tables),
+    (2, "secret word and kill_log indexes, kill_log.local_date", _migration_2_lookup_indexes),
+    (3, "kill_log.hunter_discord_id", _migration_3_kill_log_hunter),
+    (4, "game_snapshots table", _migration_4_game_snapshots),
+    (5, "game_events journal", _migration_5_game_events),
+    (6, "player_stats leaderboard counters", _migration_6_player_stats),
+    (7, "daily_kills rollup and game_settings", _migration_7_daily_kills),
+    (8, "announcement_outbox for kill channel messages", _migration_8_announcement_outbox),
+]
+
+def refresh_player_stats(con: sqlite3.Connection, player_ids: Iterable[str] | None = None):
+    """Recomputes `player_stats` rows from `player_info` and `kill_log`.
+
+    Runs inside the caller's transaction. Use after changes that can't be applied as
+    a simple increment (undos, ingests), limited to the players affected.
+
+    Args:
+        con: database connection
+        player_ids: the players to recompute, None for every player
+    """
+    cur = con.cursor()
+    refresh = """
+    UPDATE player_stats SET
+        kills = (SELECT COUNT(*) FROM kill_log WHERE kill_log.player_discord_id = player_stats.discord_id),
+        last_kill_id = (SELECT MAX(id) FROM kill_log WHERE kill_log.player_discord_id = player_stats.discord_id),
+        last_kill_at = (SELECT timestamp FROM kill_log WHERE kill_log.player_discord_id = player_stats.discord_id
+                        ORDER BY id DESC LIMIT 1),
+        eliminated = EXISTS(SELECT 1 FROM kill_log WHERE kill_log.target_discord_id = player_stats.discord_id)
+    """
+    if player_ids is None:
+        cur.execute("DELETE FROM player_stats WHERE discord_id NOT IN (SELECT discord_id FROM player_info)")
+        cur.execute("INSERT OR IGNORE INTO player_stats (discord_id) SELECT discord_id FROM player_info")
+        cur.execute(refresh)
+        return
+
+    player_ids = [(player_id,) for player_id in set(player_ids)]
+    cur.executemany("INSERT OR IGNORE INTO player_stats (discord_id) SELECT discord_id FROM player_info WHERE discord_id = ?", player_ids)
+    cur.executemany(refresh + " WHERE discord_id = ?", player_ids)
+
+def _rebuild_daily_kills(cur: sqlite3.Cursor):
+    cur.execute("DELETE FROM daily_kills")
+    cur.execute("""
+    INSERT INTO daily_kills (local_date, player_discord_id, kills)
+    SELECT local_date, player_discord_id, COUNT(*) FROM kill_log GROUP BY local_date, player_discord_id
+    """)
+
+def _remove_daily_kills(cur: sqlite3.Cursor, kill_ids: list[int]):
+    """Takes the given kills out of `daily_kills`, call before deleting them from kill_log."""
+    keys = [row for kill_id in kill_ids
+            if (row := cur.execute("SELECT local_date, player_discord_id FROM kill_log WHERE id = ?", (kill_id,)).fetchone())]
+    cur.executemany("UPDATE daily_kills SET kills = kills - 1 WHERE local_date = ? AND player_discord_id = ?", keys)
+    # Only the rows just decremented can have dropped to zero, a table-wide sweep would scan the whole rollup
+    cur.executemany("DELETE FROM daily_kills WHERE local_date = ? AND player_discord_id = ? AND kills <= 0", set(keys))
+
+def sync_game_timezone(con: sqlite3.Connection):
+    """Recomputes kill dates and the daily rollup if the configured game timezone changed.
+
+    Args:
+        con: database connection
+    """
+    cur = con.cursor()
+    stored = cur.execute("SELECT value FROM game_settings WHERE key = 'kill_date_timezone'").fetchone()
+    configured = get_game_timezone_name()
+    if stored is not None and stored[0] == configured:
+        return
+
+    info(f"Recomputing kill dates for timezone {configured}")
+    with transaction(con):
+        kills = cur.execute("SELECT id, timestamp FROM kill_log").fetchall()
+        cur.executemany("UPDATE kill_log SET local_date = ? WHERE id = ?",
+                        [(_parse_timestamp(timestamp).strftime('%Y-%m-%d'), kill_id) for kill_id, timestamp in kills])
+        _rebuild_daily_kills(cur)
+        cur.execute("INSERT OR REPLACE INTO game_settings (key, value) VALUES ('kill_date_timezone', ?)", (configured,))
+
+def get_schema_version(con: sqlite3.Connection) -> int:
+    """Returns the latest schema version applied to the database (0 if none)."""
+    row = con.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+def db_setup(con: sqlite3.Connection):
+    """Sets up the SQLite Database: enables WAL and applies any pending migrations.
+
+    Every migration runs in its own transaction together with its `schema_version`
+    row, so calling this at every startup is safe.
+
+    Args:
+        con: sqlite Database connection
+    """
+    journal_mode = con.execute("PRAGMA journal_mode = WAL").fetchone()[0]
+    debug(f'Database journal mode: {journal_mode}')
+
+    con.execute("""
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INTEGER PRIMARY KEY,
+                    description TEXT NOT NULL,
+                    applied_at TEXT NOT NULL DEFAULT current_timestamp
+                )
+                """)
+
+    current_version = get_schema_version(con)
+    for version, description, migration in MIGRATIONS:
+        if version <= current_version:
+            continue
+        with transaction(con):
+            migration(con.cursor())
+            con.execute("INSERT INTO schema_version (version, description) VALUES (?, ?)", (version, description))
+        info(f"Applied migration {version}: {description}")
+
+def apply_pragmas(con: sqlite3.Connection):
+    """Applies `CONNECTION_PRAGMAS` to a connection.
+
+    Args:
+        con: sqlite Database connection
+    """
+    for pragma, value in CONNECTION_PRAGMAS.items():
+        con.execute(f"PRAGMA {pragma} = {value}")
+
+def _ingest_roster(con: sqlite3.Connection, rows: Iterable[tuple[int, list[str]]], batch_size: int) -> int:
+    """Validates and inserts (line number, row) roster rows `batch_size` at a time in one transaction.
+
+    Returns:
+        the number of players ingested
+
+    Raises:
+        RosterError: listing every problem with the roster, nothing is ingested.
+    """
+    validator = RosterValidator()
+    player_count = 0
+    cur = con.cursor()
+
+    with transaction(con):
+        for batch in itertools.batched(rows, batch_size):
+            valid = [row for line, row in batch if validator.check_row(line, row)]
+            # Keep reading to report every problem, but stop writing rows that will be rolled back
+            if validator.problems:
+                continue
+            cur.executemany("""INSERT OR REPLACE INTO player_info 
+                            (discord_id, player_name, group_name, secret_word) VALUES(?, ?, ?, ?)
+                            """, ((player, name, group, secret_word) for player, name, group, _, secret_word in valid))
+
+            cur.executemany("INSERT OR REPLACE INTO target_assignments (player_discord_id, target_discord_id) VALUES(?, ?)",
+                            ((player, target) for player, _, _, target, _ in valid))
+
+            append_events(con, EVENT.INGEST, [
+                {"player": player, "name": name, "group": group, "secret_word": secret_word, "target": target}
+                for player, name, group, target, secret_word in valid
+            ])
+
+            refresh_player_stats(con, (row[0] for row in valid))
+            player_count += len(valid)
+
+        if problems := validator.finish():
+            raise RosterError(problems)
+
+        # Earlier snapshots don't include the new players
+        delete_snapshots_after(con, -1)
+        take_snapshot(con)
+    return player_count
+
+def add_initial_data(con: sqlite3.Connection, csv_source_filename: str, state: "GameState | None" = None,
+                     batch_size: int = INGEST_BATCH_SIZE) -> int:
     """Populates the database with initial data from given CSV file
 
+    The file is streamed and inserted `batch_size` rows at a time inside a single
+    transaction, so nothing is committed unless the whole roster is valid: unique
+    discord ids and secret words, and targets forming one cycle through every player.
+
     Args:
         con: sqlite Database connection
         csv_source_filename: filepath to CSV data
+        state: in-memory game state to reload once the data is committed
+        batch_size: rows inserted per executemany
+
+    Returns:
+        the number of players ingested
 
     Raises:
         OSError: if file does not exist.
-     
+        RosterError: listing every problem with the roster, nothing is ingested.
+
     Table headers: Discord ID, Name, Group, Target_discord_id, Secret Word 
     """
+    player_count = _ingest_roster(con, read_roster(csv_source_filename), batch_size)
+    debug(f"Ingested {player_count} players from {csv_source_filename}")
+    if state is not None:
+        state.load(con)
+    return player_count
 
-    table_data = ingest_csv(csv_source_filename)
-    debug(table_data)
-    player_info_data = [(r[0].strip(), r[1].strip(), r[2].strip(), r[4].strip()) for r in table_data]
-    target_assignments_data = [(r[0].strip(), r[3].strip()) for r in table_data]
-    cur = con.cursor()
+def add_generated_data(con: sqlite3.Connection, csv_source_filename: str, avoid_same_group: bool = True,
+                       seed: int | None = None, state: "GameState | None" = None,
+                       batch_size: int = INGEST_BATCH_SIZE) -> tuple[int, int]:
+    """Populates the database from a roster without targets, assigning them as one random cycle
 
-    cur.executemany("""INSERT OR REPLACE INTO player_info 
-                    (discord_id, player_name, group_name, secret_word) VALUES(?, ?, ?, ?)
-                    """, (player_info_data))
-    con.commit()
+    Args:
+        con: sqlite Database connection
+        csv_source_filename: filepath to CSV data
+        avoid_same_group: keep players from targeting their own group wherever the group sizes allow it
+        seed: seeds the shuffle, for reproducible assignments
+        state: in-memory game state to reload once the data is committed
+        batch_size: rows inserted per executemany
 
-    cur.executemany("INSERT OR REPLACE INTO target_assignments (player_discord_id, target_discord_id) VALUES(?, ?)", (target_assignments_data))
-    con.commit()
+    Returns:
+        the number of players ingested, and how many of them target someone from their own group
+
+    Raises:
+        OSError: if file does not exist.
+        RosterError: listing every problem with the roster, nothing is ingested.
+
+    Table headers: Discord ID, Name, Group, Secret Word
+    """
+    rows = list(read_roster(csv_source_filename))
+    if problems := [f"line {line}: expected {BARE_ROSTER_COLUMNS} columns, got {len(row)}"
+                    for line, row in rows if len(row) != BARE_ROSTER_COLUMNS]:
+        raise RosterError(problems)
+
+    order = generate_target_cycle([(row[0], row[2]) for _, row in rows], avoid_same_group, random.Random(seed))
+    targets = {player: order[(i + 1) % len(order)] for i, player in enumerate(order)}
+    groups = {row[0]: group_key(row[0], row[2]) for _, row in rows}
+    same_group = sum(1 for player, target in targets.items() if player != target and groups[player] == groups[target])
+
+    player_count = _ingest_roster(con, ((line, [player, name, group, targets[player], secret_word])
+                                        for line, (player, name, group, secret_word) in rows), batch_size)
+    debug(f"Ingested {player_count} players from {csv_source_filename} with generated targets, {same_group} in their own group")
+    if state is not None:
+        state.load(con)
+    return player_count, same_group
 
 def get_player_target(con: sqlite3.Connection, player_discord_id: str) -> str | None:
     """Retrieves a given player's target (discord id)
@@ -101,7 +471,6 @@ def get_player_target(con: sqlite3.Connection, player_discord_id: str) -> str |
         None if a player does not have a target
     """
     cur = con.cursor()
-    print(player_discord_id)
     res = cur.execute("""
     SELECT target_discord_id FROM target_assignments
     WHERE player_discord_id = ?
@@ -137,14 +506,25 @@ def get_player_info(con: sqlite3.Connection, discord_id: str) -> tuple[str, str,
 
     return (player_name, group_name, secret_word)
 
-def get_target_info_by_secret_word(con: sqlite3.Connection, secret: str):
+def get_target_info_by_secret_word(con: sqlite3.Connection, secret: str) -> tuple[str, str, str, str] | None:
+    """Retrieves the player with a given secret word (case-insensitive)
+
+    Args:
+        con: sqlite Database connection
+        secret: The secret word to look up
+
+    Returns:
+        the player's discord_id, name, group, and secret_word
+        or 
+        None if no active player has that secret word
+    """
     cur = con.cursor()
     res = cur.execute("""
     SELECT target_assignments.target_discord_id, player_info.player_name, player_info.group_name, player_info.secret_word
     FROM target_assignments
     INNER JOIN player_info ON player_info.discord_id = target_assignments.target_discord_id
-    WHERE player_info.secret_word = ?
-    """, (secret,))
+    WHERE player_info.secret_word = ? COLLATE NOCASE
+    """, (secret.strip(),))
 
     if (row := res.fetchone()) is None:
         error(f"No target associated with {secret}")
@@ -183,46 +563,86 @@ def get_target_info(con: sqlite3.Connection, player_discord_id: str) -> tuple[st
 
     return (target_discord_id, player_name, group_name, secret_word)
     
-def eliminate_player(con: sqlite3.Connection, eliminated_discord_id: str, disqualify: bool = False, player_id: str = None) -> int | None:
+def eliminate_player(con: sqlite3.Connection, eliminated_discord_id: str, disqualify: bool = False, player_id: str = None,
+                     announcement: tuple[int, str] | None = None, state: "GameState | None" = None) -> int | None:
     """Eliminate a given player from the game.
 
     Args:
         con: database connection
         elminated_discord_id: discord ID of player to eliminate.
+        disqualify: record the kill as a disqualification.
+        player_id: discord ID of the player credited with the kill (defaults to the hunter).
+        announcement: (channel id, message) queued in the outbox with the kill, its Kill ID appended.
+        state: in-memory game state, used for O(1) lookups and updated after commit.
 
     Returns:
         the Kill ID for the latest elimination
+        or
+        None if the player was already eliminated, or the player credited with the kill is no longer active
     """
 
     info(f"eliminating {eliminated_discord_id}...")
 
     cur = con.cursor()
-    res = cur.execute("""SELECT player_discord_id FROM target_assignments 
-                         WHERE  target_discord_id = ?
-                         LIMIT  1""", (eliminated_discord_id, ))
+    now = datetime.now(utc)
+    timestamp, local_date = now.strftime(TIMESTAMP_FORMAT), to_game_time(now).strftime('%Y-%m-%d')
+    with transaction(con):
+        # Checked inside the transaction, commands racing on the same players are serialized by the writer
+        if state is not None:
+            if (player_discord_id := state.ring.get_hunter(eliminated_discord_id)) is None: return None
+            new_target_discord_id = state.ring.get_target(eliminated_discord_id)
+            if player_id is not None and state.ring.get_target(player_id) is None: return None
+        else:
+            res = cur.execute("""SELECT player_discord_id FROM target_assignments 
+                                 WHERE  target_discord_id = ?
+                                 LIMIT  1""", (eliminated_discord_id, ))
+
+            if (row := res.fetchone()) is None: return None
+            player_discord_id = row[0]
+
+            if (new_target_discord_id := get_player_target(con, eliminated_discord_id)) is None: return None
+            if player_id is not None and get_player_target(con, player_id) is None: return None
+        player = 'disqualified' if disqualify else (player_discord_id if player_id is None else player_id)
 
-    if (row := res.fetchone()) is None: return None
-    player_discord_id = row[0]
+        cur.execute("""
+        INSERT INTO kill_log (player_discord_id, target_discord_id, hunter_discord_id, TIMESTAMP, local_date)
+        VALUES (?, ?, ?, ?, ?) 
+        """, (player, eliminated_discord_id, player_discord_id, timestamp, local_date,))
 
-    if (new_target_info := get_target_info(con, eliminated_discord_id)) is None: return None
-    new_target_discord_id, _, _, _ = new_target_info
-    player = 'disqualified' if disqualify else (player_discord_id if player_id is None else player_id)
-    cur.execute("""
-    INSERT INTO kill_log (player_discord_id, target_discord_id) VALUES (?, ?) 
-    """, (player, eliminated_discord_id,))
+        kill_id = cur.lastrowid
 
-    kill_id = cur.lastrowid
+        cur.execute("""
+        DELETE FROM target_assignments WHERE player_discord_id = ? 
+        """, (eliminated_discord_id,))
 
-    cur.execute("""
-    DELETE FROM target_assignments WHERE player_discord_id = ? 
-    """, (eliminated_discord_id,))
+        cur.execute("""
+        UPDATE target_assignments SET target_discord_id = ? WHERE player_discord_id = ? 
+        """, (new_target_discord_id, player_discord_id,))
 
-    info(f"Successfully eliminated {eliminated_discord_id}. kill_id: {kill_id}")
+        cur.execute("""
+        UPDATE player_stats SET kills = kills + 1, last_kill_id = ?, last_kill_at = ? WHERE discord_id = ?
+        """, (kill_id, timestamp, player,))
+        cur.execute("""
+        INSERT INTO daily_kills (local_date, player_discord_id, kills) VALUES (?, ?, 1)
+        ON CONFLICT (local_date, player_discord_id) DO UPDATE SET kills = kills + 1
+        """, (local_date, player,))
+        cur.execute("UPDATE player_stats SET eliminated = 1 WHERE discord_id = ?", (eliminated_discord_id,))
 
-    cur.execute("""
-    UPDATE target_assignments SET target_discord_id = ? WHERE player_discord_id = ? 
-    """, (new_target_discord_id, player_discord_id,))
-    con.commit()
+        append_event(con, EVENT.DISQUALIFY if disqualify else EVENT.KILL, {
+            "kill_id": kill_id, "player": player, "eliminated": eliminated_discord_id, "hunter": player_discord_id,
+        })
+
+        if kill_id % SNAPSHOT_INTERVAL == 0:
+            take_snapshot(con, kill_id)
+
+        # Committed with the kill, so a crash can't leave a kill nobody hears about
+        if announcement is not None:
+            channel_id, message = announcement
+            queue_announcement(con, channel_id, f"{message}\n-# Kill ID: {kill_id}")
+
+    info(f"Successfully eliminated {eliminated_discord_id}. kill_id: {kill_id}")
+    if state is not None:
+        state.record_elimination(kill_id, player_discord_id, eliminated_discord_id, player)
 
     info(f"Assigned new target to {player_discord_id}: {new_target_discord_id}.")
     return kill_id
@@ -238,7 +658,7 @@ def get_last_kill(con: sqlite3.Connection) -> tuple[str, str, str] | None:
     res = cur.execute("""
     SELECT id, player_discord_id, target_discord_id
     FROM kill_log
-    ORDER BY TIMESTAMP DESC
+    ORDER BY id DESC
     LIMIT 1
     """)
 
@@ -249,9 +669,13 @@ def get_last_kill(con: sqlite3.Connection) -> tuple[str, str, str] | None:
     kill_id, player_discord_id, eliminated_discord_id = kill_info
     return (kill_id, player_discord_id, eliminated_discord_id)
 
-def undo_last_kill(con:sqlite3.Connection | None=None) -> tuple[str, str, str] | None:
+def undo_last_kill(con:sqlite3.Connection | None=None, state: "GameState | None" = None) -> tuple[str, str, str] | None:
     """Undoes the last kill as detailed in kill_log
 
+    Args:
+        con: database connection, a new EXCLUSIVE connection is opened if None.
+        state: in-memory game state to update after commit.
+
     Returns
         the undone kill_id, player discord id, eliminated discord id 
     """
@@ -266,59 +690,104 @@ def undo_last_kill(con:sqlite3.Connection | None=None) -> tuple[str, str, str] |
             return None
         kill_id, player_discord_id, eliminated_discord_id = kill_info
         info(f"Undoing kill_id {kill_id}...")
-        target_discord_id = get_target_info(con, player_discord_id)[0]
-        debug(f"rollback target for {player_discord_id}...")
-        cur.execute("""
-        UPDATE target_assignments
-        SET target_discord_id = ?
-        WHERE player_discord_id = ? 
-        """, (eliminated_discord_id, player_discord_id,))
-
-        debug(f"inserting target for {eliminated_discord_id}...")
-        cur.execute("""
-        INSERT INTO target_assignments (player_discord_id, target_discord_id)
-        VALUES(?, ?)
-        """, 
-        (eliminated_discord_id, target_discord_id,))
-
-        debug(f"DELETE kill_log with ID: {kill_id}")
-        cur.execute("""
-        DELETE FROM kill_log where id = ?
-        """, 
-        (kill_id,))
-        con.commit()
+        # Kills logged before hunter_discord_id existed were always made by the hunter
+        hunter_discord_id = cur.execute("SELECT COALESCE(hunter_discord_id, player_discord_id) FROM kill_log WHERE id = ?",
+                                        (kill_id,)).fetchone()[0]
+        if state is not None:
+            target_discord_id = state.ring.get_target(hunter_discord_id)
+        else:
+            target_discord_id = get_player_target(con, hunter_discord_id)
+
+        with transaction(con):
+            debug(f"rollback target for {hunter_discord_id}...")
+            cur.execute("""
+            UPDATE target_assignments
+            SET target_discord_id = ?
+            WHERE player_discord_id = ? 
+            """, (eliminated_discord_id, hunter_discord_id,))
+
+            debug(f"inserting target for {eliminated_discord_id}...")
+            cur.execute("""
+            INSERT INTO target_assignments (player_discord_id, target_discord_id)
+            VALUES(?, ?)
+            """, 
+            (eliminated_discord_id, target_discord_id,))
+
+            debug(f"DELETE kill_log with ID: {kill_id}")
+            _remove_daily_kills(cur, [kill_id])
+            cur.execute("""
+            DELETE FROM kill_log where id = ?
+            """, 
+            (kill_id,))
+            delete_snapshots_after(con, kill_id - 1)
+            refresh_player_stats(con, (player_discord_id, eliminated_discord_id))
+            append_event(con, EVENT.UNDO, {"kill_id": kill_id})
+
+        if state is not None:
+            state.record_undo(kill_id, hunter_discord_id, eliminated_discord_id, player_discord_id)
         return kill_info
     finally:
         cur.close()
         if close_con: con.close()
 
-def roll_back_kills_to_id(rollback_id: int) -> int:
+def roll_back_kills_to_id(rollback_id: int, con: sqlite3.Connection | None = None, state: "GameState | None" = None,
+                          dry_run: bool = False) -> tuple[int, list[TARGET_CHANGE]]:
     """
     Rollback kills up to kill_id `rollback_id`
 
+    Works out which assignments change, by undoing the kills on just the rows they touch
+    or, for long rollbacks, from the nearest snapshot (see `snapshots.assignment_changes_since`),
+    and writes only those, all in a single transaction.
+
     Args:
         rollback_id: the kill ID to roll back to.
+        con: database connection, a new EXCLUSIVE connection is opened if None.
+        state: in-memory game state to update after commit.
+        dry_run: compute the changes without writing them.
     
     Returns:
-        Number of kills rolled back
+        Number of kills rolled back and the target assignments that change
     """
-    con = create_db_connection("EXCLUSIVE", 30)
+    close_con = con is None
+    if con is None:
+        con = create_db_connection("EXCLUSIVE", 30)
     cur = con.cursor()
-    info(f"Rolling back kills to {rollback_id}")
-    count = 0
+    info(f"Rolling back kills to {rollback_id}{' (dry run)' if dry_run else ''}")
     try:
-        while True:
-            if (kill_info := get_last_kill(con)) is None:
-                return count
-            elif kill_info[0] > rollback_id:
-                undo_last_kill(con)
-                count += 1
-            else:
-                return count
+        rolled_back = cur.execute("SELECT COUNT(*) FROM kill_log WHERE id > ?", (rollback_id,)).fetchone()[0]
+        if rolled_back == 0:
+            return 0, []
+
+        changes = [TARGET_CHANGE(*change) for change in assignment_changes_since(con, rollback_id)]
+        if dry_run:
+            return rolled_back, changes
+
+        with transaction(con):
+            cur.executemany("INSERT OR REPLACE INTO target_assignments (player_discord_id, target_discord_id) VALUES(?, ?)",
+                            [(change.player_id, change.new_target_id) for change in changes])
+            # Kills logged before hunter_discord_id existed were always made by the hunter
+            undone = cur.execute("""
+            SELECT id, player_discord_id, target_discord_id, COALESCE(hunter_discord_id, player_discord_id)
+            FROM kill_log WHERE id > ? ORDER BY id DESC
+            """, (rollback_id,)).fetchall()
+            append_events(con, EVENT.UNDO, [{"kill_id": kill_id} for kill_id, _, _, _ in undone])
+            _remove_daily_kills(cur, [kill_id for kill_id, _, _, _ in undone])
+            cur.execute("DELETE FROM kill_log WHERE id > ?", (rollback_id,))
+            delete_snapshots_after(con, rollback_id)
+            refresh_player_stats(con, {player for _, killer, eliminated, _ in undone for player in (killer, eliminated)})
+
+        if state is not None:
+            try:
+                for kill_id, player_discord_id, eliminated_discord_id, hunter_discord_id in undone:
+                    state.record_undo(kill_id, hunter_discord_id, eliminated_discord_id, player_discord_id)
+            except (KeyError, ValueError) as err:
+                error(f"Undoing kills in memory failed, reloading the game state: {type(err)=} {str(err)=}")
+                state.load(con)
+        info(f"Rolled back {rolled_back} kills to {rollback_id}, {len(changes)} target assignments changed")
+        return rolled_back, changes
     finally:
         cur.close()
-        con.close() 
-
+        if close_con: con.close()
 
 def get_all_kills(con: sqlite3.Connection) -> list[KILL_ENTRY]: 
     """Get all the kills from the game. 
@@ -327,12 +796,12 @@ def get_all_kills(con: sqlite3.Connection) -> list[KILL_ENTRY]:
         A list of all the kills.
     """
     cur = con.cursor()
-    res = cur.execute("SELECT id, player_discord_id, target_discord_id, datetime(timestamp, 'localtime') FROM kill_log")
+    res = cur.execute("SELECT id, player_discord_id, target_discord_id, timestamp FROM kill_log ORDER BY id")
     results = res.fetchall()
     kills = []
     for result in results:
         kill_id, player_discord_id, eliminated_discord_id, timestamp = result
-        timestamp = datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S')
+        timestamp = _parse_timestamp(timestamp)
         kills.append(KILL_ENTRY(kill_id, player_discord_id, eliminated_discord_id, timestamp))
 
     return kills
@@ -362,17 +831,17 @@ def get_kills_between_dates(con: sqlite3.Connection, start_date: datetime, end_d
     """
     cur = con.cursor()
     datetime_to_date = lambda d : d.strftime("%Y-%m-%d")
-    sql_start = "SELECT id, player_discord_id, target_discord_id, datetime(timestamp, 'localtime') FROM kill_log "
+    sql_start = "SELECT id, player_discord_id, target_discord_id, timestamp FROM kill_log "
     if end_date:
-        res = cur.execute(sql_start  + " WHERE date(timestamp, 'localtime') BETWEEN ? AND ?", (datetime_to_date(start_date), datetime_to_date(end_date),))
+        res = cur.execute(sql_start  + " WHERE local_date BETWEEN ? AND ? ORDER BY local_date, id", (datetime_to_date(start_date), datetime_to_date(end_date),))
     else:
-        res = cur.execute(sql_start + " WHERE date(timestamp, 'localtime') >= ?", (datetime_to_date(start_date),))
+        res = cur.execute(sql_start + " WHERE local_date >= ? ORDER BY local_date, id", (datetime_to_date(start_date),))
 
     results = res.fetchall()
     kills = []
     for result in results:
         kill_id, player_discord_id, eliminated_discord_id, timestamp = result
-        timestamp = datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S')
+        timestamp = _parse_timestamp(timestamp)
         kills.append(KILL_ENTRY(kill_id, player_discord_id, eliminated_discord_id, timestamp))
 
     return kills
@@ -388,12 +857,11 @@ def get_top_kills(con: sqlite3.Connection ) -> list[KILL_SUMMARY]:
         a list of kill summary (player ID, number of kills)
     """
     cur = con.cursor()
+    # Ties go to whoever reached their kill count first
     res = cur.execute("""
-    SELECT player_info.discord_id, COUNT(kill_log.player_discord_id) as kill_count 
-    FROM player_info 
-    LEFT JOIN kill_log ON player_info.discord_id = kill_log.player_discord_id 
-    GROUP BY player_info.discord_id 
-    ORDER BY kill_count DESC, kill_log.TIMESTAMP ASC
+    SELECT discord_id, kills
+    FROM player_stats
+    ORDER BY kills DESC, last_kill_id ASC, discord_id ASC
     """)
     results = res.fetchall()
     kill_summary_list = []
@@ -406,6 +874,8 @@ def get_top_kills(con: sqlite3.Connection ) -> list[KILL_SUMMARY]:
 def get_top_kills_between_dates(con: sqlite3.Connection, start_date: datetime, end_date: datetime | None = None) -> list[KILL_SUMMARY]: 
     """ Get a roll up of the players and their kill count between two dates
 
+    Sums the per-day buckets in `daily_kills` rather than scanning kill_log.
+
     Args:
         con: database connection
         start_date: Start date (inclusive)
@@ -417,17 +887,17 @@ def get_top_kills_between_dates(con: sqlite3.Connection, start_date: datetime, e
 
     datetime_to_date = lambda d : d.strftime("%Y-%m-%d")
     cur = con.cursor()
-    sql = "SELECT player_discord_id, count(player_discord_id) as kill_count FROM kill_log "
+    sql = "SELECT player_discord_id, SUM(kills) as kill_count FROM daily_kills "
 
     sql_footer = """
     GROUP BY player_discord_id
-    ORDER BY kill_count DESC
+    ORDER BY kill_count DESC, player_discord_id ASC
     """ 
 
     if end_date:
-        res = cur.execute(sql + " WHERE date(timestamp, 'localtime') BETWEEN ? AND ? " + sql_footer, (datetime_to_date(start_date), datetime_to_date(end_date),))
+        res = cur.execute(sql + " WHERE local_date BETWEEN ? AND ? " + sql_footer, (datetime_to_date(start_date), datetime_to_date(end_date),))
     else:
-        res = cur.execute(sql + " WHERE date(timestamp, 'localtime') >= ? " +  sql_footer, (datetime_to_date(start_date),))
+        res = cur.execute(sql + " WHERE local_date >= ? " +  sql_footer, (datetime_to_date(start_date),))
 
     results = res.fetchall()
     kill_summary_list = [] 
@@ -457,9 +927,10 @@ def get_all_players(con: sqlite3.Connection, active_players_only: bool =False) -
         con: database connection
     """
     cur = con.cursor()
-    query = "SELECT *, EXISTS(SELECT 1 FROM kill_log WHERE target_discord_id = player_info.discord_id) as eliminated FROM player_info"
+    eliminated = "EXISTS(SELECT 1 FROM kill_log WHERE kill_log.target_discord_id = player_info.discord_id)"
+    query = f"SELECT discord_id, player_name, group_name, secret_word, {eliminated} as eliminated FROM player_info"
     if active_players_only:
-        query += "\n WHERE eliminated = 0"
+        query += f"\n WHERE NOT {eliminated}"
     res = cur.execute(query)
     results = res.fetchall()
 
@@ -487,39 +958,224 @@ def get_target_assignments(con: sqlite3.Connection) -> list[TARGET_ASSIGNMENT]:
     
     return assignment_list 
 
-def set_player_secret_word(con: sqlite3.Connection, player_discord_id: str, new_secret_word: str) -> str | None:
+# Rows per page of paginated stat output, small enough that a page fits one discord message
+PAGE_SIZE = 15
+
+def _keyset_page(con: sqlite3.Connection, query: str, conditions: list[str], params: list, key_column: str,
+                 after: Any = None, before: Any = None, limit: int = PAGE_SIZE) -> list[tuple]:
+    """Fetches one page of `query` ordered by the unique, indexed `key_column`.
+
+    Pages start right after `after`, or end right before `before` when given. When an
+    index can be walked in `key_column` order under `conditions`, each page is an index
+    seek reading from the cursor until `limit` rows match, however deep into the table
+    it is. When it can't, like for a range on another indexed column, every matching
+    row past the cursor is sorted in a temporary B-tree before the first `limit` are returned.
+
+    Returns:
+        up to `limit` rows in ascending `key_column` order
+    """
+    conditions, params = list(conditions), list(params)
+    descending = before is not None
+    if descending:
+        conditions.append(f"{key_column} < ?")
+        params.append(before)
+    elif after is not None:
+        conditions.append(f"{key_column} > ?")
+        params.append(after)
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += f" ORDER BY {key_column} {'DESC' if descending else 'ASC'} LIMIT ?"
+    rows = con.execute(query, (*params, limit)).fetchall()
+    if descending:
+        rows.reverse()
+    return rows
+
+def get_kills_page(con: sqlite3.Connection, start_date: datetime | None = None, end_date: datetime | None = None,
+                   after_id: int | None = None, before_id: int | None = None, limit: int = PAGE_SIZE) -> list[KILL_ENTRY]:
+    """Returns one page of kills ordered by kill id.
+
+    Pages of a single date are an index seek, pages of a date range sort the range's
+    kills past the cursor.
+
+    Args:
+        con: database connection
+        start_date: only kills on or after this date (inclusive) if given
+        end_date: only kills on or before this date (inclusive) if given
+        after_id: page starts after this kill id, None for the first page
+        before_id: page ends before this kill id, for paging backwards
+        limit: maximum number of kills
+    """
+    datetime_to_date = lambda d : d.strftime("%Y-%m-%d")
+    conditions, params = [], []
+    if start_date and end_date and datetime_to_date(start_date) == datetime_to_date(end_date):
+        # idx_kill_log_local_date holds each date's kills in id order, a range of dates isn't
+        conditions.append("local_date = ?")
+        params.append(datetime_to_date(start_date))
+        start_date = end_date = None
+    if start_date:
+        conditions.append("local_date >= ?")
+        params.append(datetime_to_date(start_date))
+    if end_date:
+        conditions.append("local_date <= ?")
+        params.append(datetime_to_date(end_date))
+    rows = _keyset_page(con, "SELECT id, player_discord_id, target_discord_id, timestamp FROM kill_log",
+                        conditions, params, "id", after_id, before_id, limit)
+    return [KILL_ENTRY(kill_id, player_discord_id, eliminated_discord_id, _parse_timestamp(timestamp))
+            for kill_id, player_discord_id, eliminated_discord_id, timestamp in rows]
+
+def get_players_page(con: sqlite3.Connection, active_players_only: bool = False, after_id: str | None = None,
+                     before_id: str | None = None, limit: int = PAGE_SIZE) -> list[PLAYER]:
+    """Returns one page of players ordered by discord id.
+
+    Args:
+        con: database connection
+        active_players_only: leave out eliminated players
+        after_id: page starts after this discord id, None for the first page
+        before_id: page ends before this discord id, for paging backwards
+        limit: maximum number of players
+    """
+    eliminated = "EXISTS(SELECT 1 FROM kill_log WHERE kill_log.target_discord_id = player_info.discord_id)"
+    conditions = [f"NOT {eliminated}"] if active_players_only else []
+    rows = _keyset_page(con, f"SELECT discord_id, player_name, group_name, secret_word, {eliminated} FROM player_info",
+                        conditions, [], "discord_id", after_id, before_id, limit)
+    return [PLAYER(discord_id, player_name, group_name, secret_word, bool(eliminated))
+            for discord_id, player_name, group_name, secret_word, eliminated in rows]
+
+def get_target_assignments_page(con: sqlite3.Connection, after_id: str | None = None, before_id: str | None = None,
+                                limit: int = PAGE_SIZE) -> list[TARGET_ASSIGNMENT]:
+    """Returns one page of target assignments ordered by player discord id.
+
+    Args:
+        con: database connection
+        after_id: page starts after this player id, None for the first page
+        before_id: page ends before this player id, for paging backwards
+        limit: maximum number of assignments
+    """
+    rows = _keyset_page(con, "SELECT player_discord_id, target_discord_id FROM target_assignments",
+                        [], [], "player_discord_id", after_id, before_id, limit)
+    return [TARGET_ASSIGNMENT(*row) for row in rows]
+
+def queue_announcement(con: sqlite3.Connection, channel_id: int, content: str) -> int:
+    """Adds a message to the outbox, to be sent to `channel_id` by `announcer.py`.
+
+    Args:
+        con: database connection
+        channel_id: discord channel to send the message to
+        content: the message
+
+    Returns:
+        the outbox id of the message
+    """
+    with transaction(con):
+        cur = con.execute("INSERT INTO announcement_outbox (channel_id, content) VALUES (?, ?)", (channel_id, content))
+    return cur.lastrowid
+
+def get_pending_announcements(con: sqlite3.Connection, limit: int = 100) -> list[tuple[int, int, str]]:
+    """Retrieves the oldest unsent messages in the outbox.
+
+    Args:
+        con: database connection
+        limit: maximum number of messages to return
+
+    Returns:
+        (outbox id, channel id, content) of each message, oldest first
+    """
+    return con.execute("SELECT id, channel_id, content FROM announcement_outbox ORDER BY id LIMIT ?", (limit,)).fetchall()
+
+def delete_announcements(con: sqlite3.Connection, announcement_ids: list[int]):
+    """Removes sent (or undeliverable) messages from the outbox.
+
+    Args:
+        con: database connection
+        announcement_ids: outbox ids of the messages
+    """
+    with transaction(con):
+        con.executemany("DELETE FROM announcement_outbox WHERE id = ?", ((announcement_id,) for announcement_id in announcement_ids))
+
+def set_player_secret_word(con: sqlite3.Connection, player_discord_id: str, new_secret_word: str,
+                           state: "GameState | None" = None) -> str | None:
     """set a player's secret word
 
     Args:
         con: database connection
         player_discord_id: The player's discord Id
         new_secret_word: The new secret word associated with the player
+        state: in-memory game state to update after commit.
 
     Returns:
         the old secret word or None if the player does not exist
+
+    Raises:
+        ValueError: if another active player already has the secret word (ignoring case)
     """
     cur = con.cursor()
     player_info = get_player_info(con, player_discord_id.strip())
     if player_info is None:
         return None
     _, _, secret_word = player_info 
-    cur.execute("UPDATE player_info SET secret_word = ? WHERE discord_id = ?", (new_secret_word.strip(), player_discord_id.strip()))
-    con.commit()
+    with transaction(con):
+        # A sock finds its target by secret word, so no two active players may share one
+        owner = cur.execute("""
+        SELECT player_info.discord_id FROM player_info
+        INNER JOIN target_assignments ON target_assignments.player_discord_id = player_info.discord_id
+        WHERE player_info.secret_word = ? COLLATE NOCASE AND player_info.discord_id != ?
+        """, (new_secret_word.strip(), player_discord_id.strip())).fetchone()
+        if owner is not None:
+            raise ValueError(f"{owner[0]} already has the secret word {new_secret_word.strip()}")
+        cur.execute("UPDATE player_info SET secret_word = ? WHERE discord_id = ?", (new_secret_word.strip(), player_discord_id.strip()))
+        append_event(con, EVENT.SECRET_RESET, {"player": player_discord_id.strip(), "secret_word": new_secret_word.strip()})
+    if state is not None:
+        state.record_secret_word(player_discord_id.strip(), new_secret_word)
     info(f"Updated {player_discord_id}'s secret word from {secret_word} to {new_secret_word}")
     return secret_word
 
-def delete_all_data(con: sqlite3.Connection):
+def delete_all_data(con: sqlite3.Connection, state: "GameState | None" = None):
     cur = con.cursor()
-    cur.execute('DELETE FROM player_info')
-    cur.execute('DELETE FROM target_assignments')
-    cur.execute('DELETE FROM kill_log')
-    cur.execute("UPDATE sqlite_sequence SET seq = 0 WHERE name='kill_log'")
-    con.commit()
+    with transaction(con):
+        cur.execute('DELETE FROM player_info')
+        cur.execute('DELETE FROM target_assignments')
+        cur.execute('DELETE FROM kill_log')
+        cur.execute('DELETE FROM game_snapshots')
+        cur.execute('DELETE FROM player_stats')
+        cur.execute('DELETE FROM daily_kills')
+        cur.execute("UPDATE sqlite_sequence SET seq = 0 WHERE name='kill_log'")
+        # The journal is append-only, it records the reset instead of being cleared
+        append_event(con, EVENT.RESET, {})
+
+    if state is not None:
+        state.clear()
+
+def rebuild_from_journal(con: sqlite3.Connection, state: "GameState | None" = None) -> ReplayState:
+    """Replaces `player_info` and `target_assignments` with the state replayed from `game_events`.
+
+    Args:
+        con: database connection
+        state: in-memory game state to reload after commit.
+
+    Returns:
+        the replayed state
+    """
+    replayed = replay(con)
+    cur = con.cursor()
+    with transaction(con):
+        cur.execute('DELETE FROM player_info')
+        cur.execute('DELETE FROM target_assignments')
+        cur.executemany("INSERT INTO player_info (discord_id, player_name, group_name, secret_word) VALUES(?, ?, ?, ?)",
+                        ((player, *details) for player, details in replayed.players.items()))
+        cur.executemany("INSERT INTO target_assignments (player_discord_id, target_discord_id) VALUES(?, ?)",
+                        replayed.assignments.items())
+        refresh_player_stats(con)
+    info(f"Rebuilt game state from {replayed.events_applied} journal events")
+
+    if state is not None:
+        state.load(con)
+    return replayed
     
 
 def create_db_connection(\
             isolation_level: Literal["DEFERRED", "EXCLUSIVE", "IMMEDIATE"] | None = "DEFERRED",
-            timeout: float = 5.0
+            timeout: float = 5.0,
+            database_path: str = DATABASE_PATH
                          ) -> sqlite3.Connection:   
         
     """Returns a connection to the database.
@@ -527,7 +1183,14 @@ def create_db_connection(\
     Args:
         isolation_level: defines the isolation level of the connection.
         timeout: connection timeout threshold. 
+        database_path: filepath to the sqlite database.
+
+    Note:
+        Connections may be handed between threads (see `pool.py`),
+        callers are responsible for never sharing one concurrently.
     """
-    return sqlite3.connect(DATABASE_PATH, isolation_level=isolation_level, timeout=timeout)
+    con = sqlite3.connect(database_path, isolation_level=isolation_level, timeout=timeout, check_same_thread=False)
+    apply_pragmas(con)
+    return con
 
 
@@ -0,0 +1,65 @@
+# Module acknowledging slow slash commands right away and answering them with a followup
+import functools
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable
+
+import discord
+
+from command_log import record_ack
+from logger import debug, error, info
+from metrics import COMMAND_ACK_SECONDS, MISSED_DEADLINES
+
+# Discord fails an interaction that isn't acknowledged within this many seconds
+INTERACTION_DEADLINE = 3.0
+# Acknowledgements with less time than this left before the deadline are logged
+DEADLINE_WARNING = 1.0
+
+def interaction_age(ctx) -> float:
+    """Seconds since discord created the interaction of `ctx`, 0 for contexts without one."""
+    if ctx.interaction is None:
+        return 0.0
+    created = discord.utils.snowflake_time(ctx.interaction.id)
+    return max(0.0, (datetime.now(timezone.utc) - created).total_seconds())
+
+def deferred(ephemeral: bool = False) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """Acknowledges a slash command with "thinking..." before running its callback.
+
+    The callback's `ctx.respond` calls then send followups, which discord accepts for 15
+    minutes instead of 3 seconds. How long the acknowledgement and the whole command
+    took is logged and recorded in `metrics`. Apply below `instrument_command` and above
+    `in_game`, opening a game's database can be slow too.
+
+    The first response replaces "thinking..." and is shown like it, whatever its own
+    `ephemeral` says, so commands whose replies must stay private have to defer privately.
+
+    Args:
+        ephemeral: whether the first response is only shown to the invoker
+    """
+    def decorator(fn: Callable[..., Any]) -> Callable[..., Any]:
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            ctx = next(arg for arg in args if hasattr(arg, "interaction"))
+            name = ctx.command.qualified_name if ctx.command else fn.__name__
+            try:
+                await ctx.defer(ephemeral=ephemeral)
+            except discord.NotFound:
+                # Nothing can be sent for an interaction discord has given up on
+                MISSED_DEADLINES.inc(name)
+                error(f"/{name} missed discord's {INTERACTION_DEADLINE:g}s deadline, acknowledged after {interaction_age(ctx):.2f}s")
+                return
+            ack = interaction_age(ctx)
+            COMMAND_ACK_SECONDS.observe(ack, name)
+            record_ack(ack)
+            if INTERACTION_DEADLINE - ack < DEADLINE_WARNING:
+                info(f"/{name} was acknowledged {ack:.2f}s after being invoked, {max(0.0, INTERACTION_DEADLINE - ack):.2f}s before discord's deadline")
+
+            start = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                answered = ack + time.perf_counter() - start
+                note = ", past the deadline deferring saved it from" if answered > INTERACTION_DEADLINE else ""
+                debug(f"/{name} acknowledged after {ack * 1000:.0f} ms, answered after {answered * 1000:.0f} ms{note}")
+        return wrapper
+    return decorator
@@ -0,0 +1,330 @@
+# Module routing every guild to its own game, each game living in its own SQLite file
+import asyncio
+import functools
+import os
+import re
+import sqlite3
+import time
+from contextlib import closing, contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Iterator
+
+from async_database import AsyncDatabase, db as default_db
+from config import GAME_IDLE_MINUTES, GUILD_ID, KILL_CHANNEL_ID
+from database import DATABASE_PATH, create_db_connection, db_setup, sync_game_timezone, transaction
+from logger import debug, error, info
+from model import GAME
+from pool import ConnectionPool
+from state import GameState
+
+DATA_DIR = os.path.dirname(DATABASE_PATH) or '.'
+REGISTRY_PATH = os.path.join(DATA_DIR, 'games.db')
+GAMES_DIR = os.path.join(DATA_DIR, 'games')
+# Name of the game in GUILD_ID's DATABASE_PATH, registered on first start
+DEFAULT_GAME_NAME = 'sockwars'
+GAME_NAME_PATTERN = re.compile(r'[a-z0-9][a-z0-9_-]{0,31}')
+# Readers per lazily opened game, most games only see a handful of commands at a time
+GAME_MAX_READERS = 2
+
+def registry_setup(con: sqlite3.Connection):
+    """Creates the `games` table listing every game and the guild it is played in.
+
+    Args:
+        con: connection to the registry database
+    """
+    con.execute("PRAGMA journal_mode = WAL")
+    con.execute("""
+                CREATE TABLE IF NOT EXISTS games (
+                    name TEXT PRIMARY KEY,
+                    guild_id INTEGER NOT NULL,
+                    database_path TEXT NOT NULL,
+                    kill_channel_id INTEGER NOT NULL,
+                    created_at TEXT NOT NULL DEFAULT current_timestamp,
+                    archived_at TEXT
+                )
+                """)
+    # A guild plays one game at a time, archived games are kept for the record
+    con.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_games_active_guild ON games (guild_id) WHERE archived_at IS NULL")
+
+def get_games(con: sqlite3.Connection, guild_id: int | None = None) -> list[GAME]:
+    """Returns every registered game, oldest first, optionally only those of `guild_id`.
+
+    Args:
+        con: connection to the registry database
+        guild_id: (optional) only list this guild's games
+    """
+    query = "SELECT name, guild_id, database_path, kill_channel_id, created_at, archived_at FROM games"
+    params = ()
+    if guild_id is not None:
+        query += " WHERE guild_id = ?"
+        params = (guild_id,)
+    return [GAME(*row) for row in con.execute(query + " ORDER BY created_at, name", params)]
+
+def register_game(con: sqlite3.Connection, name: str, guild_id: int, database_path: str, kill_channel_id: int) -> GAME:
+    """Adds a game as the active game of `guild_id`.
+
+    Args:
+        con: connection to the registry database
+        name: unique name of the game
+        guild_id: guild the game is played in
+        database_path: filepath to the game's sqlite database
+        kill_channel_id: channel kills are announced in
+
+    Raises:
+        ValueError: if the name is taken or the guild already has an active game
+    """
+    with transaction(con):
+        if con.execute("SELECT 1 FROM games WHERE name = ?", (name,)).fetchone():
+            raise ValueError(f"A game called {name} already exists")
+        if (active := con.execute("SELECT name FROM games WHERE guild_id = ? AND archived_at IS NULL", (guild_id,)).fetchone()):
+            raise ValueError(f"This server is already playing {active[0]}, archive it first")
+        con.execute("INSERT INTO games (name, guild_id, database_path, kill_channel_id) VALUES (?, ?, ?, ?)",
+                    (name, guild_id, database_path, kill_channel_id))
+    return next(game for game in get_games(con, guild_id) if game.name == name)
+
+def archive_game(con: sqlite3.Connection, name: str) -> bool:
+    """Marks a game archived so it is no longer routed to. Its database file is kept.
+
+    Returns:
+        whether an active game called `name` existed
+    """
+    with transaction(con):
+        cur = con.execute("UPDATE games SET archived_at = current_timestamp WHERE name = ? AND archived_at IS NULL", (name,))
+    return cur.rowcount > 0
+
+def _prepare_game(con: sqlite3.Connection, state: GameState):
+    db_setup(con)
+    sync_game_timezone(con)
+    state.load(con)
+
+
+class Game:
+    """An open game: its registry entry, in-memory state and `AsyncDatabase` over its own pool."""
+    def __init__(self, entry: GAME, db: AsyncDatabase):
+        self.entry = entry
+        self.db = db
+        self.state = db.state
+        self.users = 0
+        self.last_used = time.monotonic()
+
+    @property
+    def name(self) -> str:
+        return self.entry.name
+
+    @property
+    def kill_channel_id(self) -> int:
+        return self.entry.kill_channel_id
+
+
+class GameRouter:
+    """Resolves a guild to its active game, opening each game's database on first use.
+
+    The game in `DATABASE_PATH` is the default game, served by `async_database.db` and
+    never closed. Every other game gets its own `ConnectionPool`, `GameState` and
+    executors when a command first needs it, and they are closed again once it has
+    been idle for `idle_timeout` seconds (see `evict_idle`).
+    """
+    def __init__(self, registry_path: str = REGISTRY_PATH, games_dir: str = GAMES_DIR, idle_timeout: float = GAME_IDLE_MINUTES * 60):
+        self.registry_path = registry_path
+        self.games_dir = games_dir
+        self.idle_timeout = idle_timeout
+        self.default = Game(GAME(DEFAULT_GAME_NAME, GUILD_ID, DATABASE_PATH, KILL_CHANNEL_ID), default_db)
+        # guild id -> the registry entry of its active game
+        self._active: dict[int, GAME] = {}
+        # game name -> open game, the default game included
+        self._games: dict[str, Game] = {}
+        self._open_lock = asyncio.Lock()
+        # Set once `warm_up` has loaded the default game, commands wait for it
+        self._warm = asyncio.Event()
+
+    def _registry(self) -> closing[sqlite3.Connection]:
+        return closing(create_db_connection("IMMEDIATE", 30.0, self.registry_path))
+
+    async def _in_registry(self, fn: Callable[..., Any], *args) -> Any:
+        def run():
+            with self._registry() as con:
+                return fn(con, *args)
+        return await asyncio.to_thread(run)
+
+    def _is_default(self, entry: GAME) -> bool:
+        return os.path.abspath(entry.database_path) == os.path.abspath(DATABASE_PATH)
+
+    def setup(self):
+        """Loads the registry at startup, registering the default game in GUILD_ID the first time."""
+        with self._registry() as con:
+            registry_setup(con)
+            if not get_games(con):
+                register_game(con, DEFAULT_GAME_NAME, GUILD_ID, DATABASE_PATH, KILL_CHANNEL_ID)
+            # KILL_CHANNEL_ID stays the way to move the default game's announcements
+            with transaction(con):
+                con.execute("UPDATE games SET kill_channel_id = ? WHERE database_path = ?", (KILL_CHANNEL_ID, DATABASE_PATH))
+            games = get_games(con)
+
+        self._active = {entry.guild_id: entry for entry in games if entry.archived_at is None}
+        self._games = {}
+        for entry in games:
+            if self._is_default(entry):
+                self.default.entry = entry
+                self._games[entry.name] = self.default
+        info(f"Loaded game registry with {len(self._active)} active games")
+
+    async def warm_up(self):
+        """Loads the default game's state in one pass and opens its reader connections.
+
+        Runs alongside the gateway connect at startup. `resolve` and `open_game` wait
+        until it is done, so no command sees a half loaded game.
+        """
+        await self.default.db.write(self.default.state.load)
+        await asyncio.to_thread(self.default.db.pool.open_readers)
+        self._warm.set()
+
+    async def _open(self, entry: GAME) -> Game:
+        if (game := self._games.get(entry.name)) is not None:
+            return game
+        async with self._open_lock:
+            if (game := self._games.get(entry.name)) is not None:
+                return game
+            game = Game(entry, AsyncDatabase(ConnectionPool(entry.database_path, max_readers=GAME_MAX_READERS), GameState()))
+            try:
+                await game.db.write(_prepare_game, game.state)
+            except BaseException:
+                await asyncio.to_thread(self._shut_down, game)
+                raise
+            self._games[entry.name] = game
+            info(f"Opened game {entry.name} ({len(self._games)} open)")
+            return game
+
+    async def resolve(self, guild_id: int | None) -> Game | None:
+        """Returns the active game of `guild_id`, opening it if needed, or None if the guild has none."""
+        await self._warm.wait()
+        if (entry := self._active.get(guild_id)) is None:
+            return None
+        return await self._open(entry)
+
+    async def open_game(self, name: str) -> Game | None:
+        """Returns the active game called `name`, opening it if needed, or None if it is archived or unknown."""
+        await self._warm.wait()
+        if (entry := next((entry for entry in self._active.values() if entry.name == name), None)) is None:
+            return None
+        return await self._open(entry)
+
+    async def create_game(self, name: str, guild_id: int, kill_channel_id: int) -> Game:
+        """Registers a new game with an empty database as the active game of `guild_id`.
+
+        Raises:
+            ValueError: if the name is invalid or taken, or the guild already has an active game
+        """
+        if not GAME_NAME_PATTERN.fullmatch(name):
+            raise ValueError("Game names are 1-32 lowercase letters, digits, '-' or '_'")
+        os.makedirs(self.games_dir, exist_ok=True)
+        entry = await self._in_registry(register_game, name, guild_id, os.path.join(self.games_dir, f"{name}.db"), kill_channel_id)
+        self._active[guild_id] = entry
+        info(f"Created game {name} for guild {guild_id}")
+        return await self._open(entry)
+
+    async def archive_game(self, name: str, guild_id: int) -> bool:
+        """Stops routing `guild_id` to its active game `name`. Its connections close once idle.
+
+        Returns:
+            whether `name` was the guild's active game
+        """
+        if (entry := self._active.get(guild_id)) is None or entry.name != name:
+            return False
+        await self._in_registry(archive_game, name)
+        del self._active[guild_id]
+        info(f"Archived game {name} of guild {guild_id}")
+        await self.evict_idle()
+        return True
+
+    async def list_games(self, guild_id: int | None = None) -> list[GAME]:
+        """Returns the registered games, optionally only those of `guild_id`."""
+        return await self._in_registry(get_games, guild_id)
+
+    def active_game_names(self) -> list[str]:
+        return [entry.name for entry in self._active.values()]
+
+    def is_open(self, name: str) -> bool:
+        return name in self._games
+
+    def _shut_down(self, game: Game):
+        game.db.shutdown()
+        game.db.pool.close()
+
+    async def evict_idle(self) -> int:
+        """Closes every game idle for `idle_timeout` or archived, and not running a command.
+
+        Returns:
+            the number of games closed
+        """
+        now = time.monotonic()
+        active_names = {entry.name for entry in self._active.values()}
+        evicted = [game for game in self._games.values()
+                   if game is not self.default and game.users == 0
+                   and (game.name not in active_names or now - game.last_used > self.idle_timeout)]
+        for game in evicted:
+            del self._games[game.name]
+        for game in evicted:
+            await asyncio.to_thread(self._shut_down, game)
+            debug(f"Closed idle game {game.name}")
+        return len(evicted)
+
+    async def evict_idle_games(self, interval: float = 60.0):
+        """Runs `evict_idle` every `interval` seconds forever."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.evict_idle()
+            except Exception as err:
+                error(f"Evicting idle games failed: {type(err)=} {str(err)=}")
+
+    def close(self):
+        """Closes every open game except the default one."""
+        for game in list(self._games.values()):
+            if game is not self.default:
+                self._shut_down(game)
+        self._games = {name: game for name, game in self._games.items() if game is self.default}
+
+
+game_router = GameRouter()
+
+_current_game: ContextVar[Game | None] = ContextVar("current_game", default=None)
+
+def current_game() -> Game:
+    """Returns the game of the command being run, the default game outside of commands."""
+    return _current_game.get() or game_router.default
+
+@contextmanager
+def playing(game: Game) -> Iterator[Game]:
+    """Makes `game` the current game for the `with` block and keeps it from being evicted meanwhile."""
+    token = _current_game.set(game)
+    game.users += 1
+    try:
+        yield game
+    finally:
+        game.users -= 1
+        game.last_used = time.monotonic()
+        _current_game.reset(token)
+
+def in_game(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """Runs a slash command callback in the active game of the guild it was invoked in.
+
+    Guilds without an active game are told so instead. Apply below the command decorators.
+    """
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        ctx = next(arg for arg in args if hasattr(arg, "interaction"))
+        if (game := await game_router.resolve(ctx.guild_id)) is None:
+            await ctx.respond("No game is running in this server. An admin can start one with `/admin-create-game`.", ephemeral=True)
+            return
+        with playing(game):
+            return await fn(*args, **kwargs)
+    return wrapper
+
+
+class RoutedDatabase:
+    """Stands in for the `AsyncDatabase` of `current_game()`, e.g. `await db.get_target_info(player_id)`."""
+    def __getattr__(self, name: str) -> Any:
+        return getattr(current_game().db, name)
+
+
+db = RoutedDatabase()
@@ -0,0 +1,124 @@
+# Module for the append-only game event journal
+import json
+import sqlite3
+from typing import Any, Iterator
+
+class EVENT:
+    BASELINE     = 'baseline'
+    INGEST       = 'ingest'
+    KILL         = 'kill'
+    DISQUALIFY   = 'dq'
+    UNDO         = 'undo'
+    SECRET_RESET = 'secret_reset'
+    RESET        = 'reset'
+
+def append_event(con: sqlite3.Connection, event_type: str, payload: dict[str, Any]) -> int:
+    """Appends an event to `game_events`.
+
+    Call inside the transaction making the change so the journal and the tables can
+    never disagree.
+
+    Args:
+        con: database connection
+        event_type: one of the `EVENT` types
+        payload: JSON serializable event data
+
+    Returns:
+        the event id
+    """
+    cur = con.execute("INSERT INTO game_events (event_type, payload) VALUES (?, ?)",
+                      (event_type, json.dumps(payload, separators=(',', ':'))))
+    return cur.lastrowid
+
+def append_events(con: sqlite3.Connection, event_type: str, payloads: list[dict[str, Any]]):
+    """Appends many events of the same type, see `append_event`."""
+    con.executemany("INSERT INTO game_events (event_type, payload) VALUES (?, ?)",
+                    [(event_type, json.dumps(payload, separators=(',', ':'))) for payload in payloads])
+
+def iter_events(con: sqlite3.Connection, up_to_event_id: int | None = None, batch_size: int = 5000) -> Iterator[tuple[int, str, str]]:
+    """Streams (event id, event type, raw payload) in order, `batch_size` rows at a time."""
+    cur = con.cursor()
+    if up_to_event_id is None:
+        cur.execute("SELECT id, event_type, payload FROM game_events ORDER BY id")
+    else:
+        cur.execute("SELECT id, event_type, payload FROM game_events WHERE id <= ? ORDER BY id", (up_to_event_id,))
+    while rows := cur.fetchmany(batch_size):
+        yield from rows
+
+
+class ReplayState:
+    """Game state rebuilt purely from journal events.
+
+    `players` maps discord id -> (name, group, secret word), `assignments` maps
+    player -> target, and `kills` remembers (eliminated id, hunter id) per kill id so
+    undo events can be reversed.
+    """
+    __slots__ = ("players", "assignments", "kills", "events_applied")
+
+    def __init__(self):
+        self.players: dict[str, tuple[str, str, str]] = {}
+        self.assignments: dict[str, str] = {}
+        self.kills: dict[int, tuple[str, str]] = {}
+        self.events_applied = 0
+
+    def apply(self, event_type: str, payload: dict[str, Any]):
+        """Applies one event.
+
+        Raises:
+            ValueError: on an unknown event type
+        """
+        match event_type:
+            case EVENT.KILL | EVENT.DISQUALIFY:
+                eliminated, hunter = payload['eliminated'], payload['hunter']
+                self.assignments[hunter] = self.assignments.pop(eliminated)
+                self.kills[payload['kill_id']] = (eliminated, hunter)
+            case EVENT.UNDO:
+                eliminated, hunter = self.kills.pop(payload['kill_id'])
+                self.assignments[eliminated] = self.assignments[hunter]
+                self.assignments[hunter] = eliminated
+            case EVENT.SECRET_RESET:
+                name, group, _ = self.players[payload['player']]
+                self.players[payload['player']] = (name, group, payload['secret_word'])
+            case EVENT.INGEST:
+                self.players[payload['player']] = (payload['name'], payload['group'], payload['secret_word'])
+                self.assignments[payload['player']] = payload['target']
+            case EVENT.BASELINE:
+                self.players = {player: (name, group, secret) for player, name, group, secret in payload['players']}
+                self.assignments = dict(payload['assignments'])
+                self.kills = {kill_id: (eliminated, hunter) for kill_id, eliminated, hunter in payload['kills']}
+            case EVENT.RESET:
+                self.players, self.assignments, self.kills = {}, {}, {}
+            case _:
+                raise ValueError(f"Unknown event type {event_type}")
+        self.events_applied += 1
+
+def replay(con: sqlite3.Connection, up_to_event_id: int | None = None) -> ReplayState:
+    """Rebuilds the game state by replaying the journal from the start.
+
+    Args:
+        con: database connection
+        up_to_event_id: stop after this event (inclusive), None for the whole journal
+    """
+    state = ReplayState()
+    loads = json.loads
+    for _, event_type, payload in iter_events(con, up_to_event_id):
+        state.apply(event_type, loads(payload))
+    return state
+
+def find_journal_problems(con: sqlite3.Connection) -> list[str]:
+    """Replays the journal and compares the result with `player_info` and `target_assignments`.
+
+    Returns:
+        A description of every inconsistency found, empty if the journal matches.
+    """
+    state = replay(con)
+    problems = []
+    players = {row[0]: tuple(row[1:]) for row in con.execute("SELECT discord_id, player_name, group_name, secret_word FROM player_info")}
+    assignments = dict(con.execute("SELECT player_discord_id, target_discord_id FROM target_assignments").fetchall())
+    for discord_id in players.keys() | state.players.keys():
+        if players.get(discord_id) != state.players.get(discord_id):
+            problems.append(f"player {discord_id}: {players.get(discord_id)} in player_info, {state.players.get(discord_id)} in journal")
+    for discord_id in assignments.keys() | state.assignments.keys():
+        if assignments.get(discord_id) != state.assignments.get(discord_id):
+            problems.append(f"{discord_id} targets {assignments.get(discord_id)} in target_assignments, {state.assignments.get(discord_id)} in journal")
+    return problems
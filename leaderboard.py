@@ -0,0 +1,101 @@
+# Module holding the in-memory kill leaderboard
+import bisect
+import sqlite3
+
+from logger import info
+from model import KILL_SUMMARY
+
+_NO_KILLS = float('inf')
+
+
+class Leaderboard:
+    """Players ranked by kill count, kept sorted as kills are made and undone.
+
+    Ties are broken by who reached their count first (lowest last kill id), then by
+    discord id. Ranking a player is O(log n) to find plus a list insert, and reading
+    the top N is a slice. Mirrors the `player_stats` table.
+    """
+    def __init__(self):
+        self._kill_ids: dict[str, list[int]] = {}
+        self._eliminated: dict[str, bool] = {}
+        self._ranking: list[tuple[int, float, str]] = []
+
+    def __len__(self) -> int:
+        return len(self._kill_ids)
+
+    def _key(self, discord_id: str) -> tuple[int, float, str]:
+        kill_ids = self._kill_ids[discord_id]
+        return (-len(kill_ids), kill_ids[-1] if kill_ids else _NO_KILLS, discord_id)
+
+    def _unrank(self, discord_id: str):
+        key = self._key(discord_id)
+        index = bisect.bisect_left(self._ranking, key)
+        if index < len(self._ranking) and self._ranking[index] == key:
+            del self._ranking[index]
+
+    def load(self, con: sqlite3.Connection):
+        """Rebuilds the leaderboard from `player_stats` and `kill_log`.
+
+        Args:
+            con: database connection
+        """
+        eliminated = dict(con.execute("SELECT discord_id, eliminated FROM player_stats").fetchall())
+        kill_ids = {discord_id: [] for discord_id in eliminated}
+        for player_discord_id, kill_id in con.execute("SELECT player_discord_id, id FROM kill_log ORDER BY id"):
+            if player_discord_id in kill_ids:
+                kill_ids[player_discord_id].append(kill_id)
+
+        self._kill_ids = kill_ids
+        self._eliminated = {discord_id: bool(value) for discord_id, value in eliminated.items()}
+        self._ranking = sorted(self._key(discord_id) for discord_id in kill_ids)
+        info(f"Loaded leaderboard with {len(self._kill_ids)} players")
+
+    def clear(self):
+        self._kill_ids = {}
+        self._eliminated = {}
+        self._ranking = []
+
+    def add_kill(self, discord_id: str, kill_id: int):
+        if discord_id not in self._kill_ids:
+            # e.g. disqualifications, which are credited to no player
+            return
+        self._unrank(discord_id)
+        self._kill_ids[discord_id].append(kill_id)
+        bisect.insort(self._ranking, self._key(discord_id))
+
+    def remove_kill(self, discord_id: str, kill_id: int):
+        if kill_id not in self._kill_ids.get(discord_id, ()):
+            return
+        self._unrank(discord_id)
+        self._kill_ids[discord_id].remove(kill_id)
+        bisect.insort(self._ranking, self._key(discord_id))
+
+    def set_eliminated(self, discord_id: str, eliminated: bool):
+        if discord_id in self._eliminated:
+            self._eliminated[discord_id] = eliminated
+
+    def get_kills(self, discord_id: str) -> int:
+        return len(self._kill_ids.get(discord_id, ()))
+
+    def top(self, n: int | None = None) -> list[KILL_SUMMARY]:
+        """Returns the top `n` players (everyone if None) and their kill counts."""
+        ranking = self._ranking[:n] if n is not None else self._ranking[:]
+        return [KILL_SUMMARY(discord_id, -negative_kills) for negative_kills, _, discord_id in ranking]
+
+    def page(self, start: int, stop: int) -> list[KILL_SUMMARY]:
+        """Returns the players ranked `start` (inclusive) through `stop` (exclusive), counting from 0."""
+        return [KILL_SUMMARY(discord_id, -negative_kills) for negative_kills, _, discord_id in self._ranking[start:stop]]
+
+    def find_problems(self, con: sqlite3.Connection) -> list[str]:
+        """Compares the ranking against `player_stats`.
+
+        Returns:
+            A description of every inconsistency found, empty if the leaderboard matches.
+        """
+        expected = con.execute("""
+        SELECT discord_id, kills FROM player_stats ORDER BY kills DESC, last_kill_id ASC, discord_id ASC
+        """).fetchall()
+        actual = [(summary.player_discord_id, summary.kills) for summary in self.top()]
+        if actual == expected:
+            return []
+        return [f"leaderboard ranking differs from player_stats ({len(actual)} vs {len(expected)} players)"]
@@ -1,29 +1,196 @@
 # Module to enable timestamped logs
+import atexit
+import json
+import os
+import queue
+import threading
+import time
 from datetime import datetime
-from pytz import utc, timezone
+from pytz import timezone
 
 class LOG_LEVEL:
     ERROR = 'ERR'
     INFO  = 'INF'
     DEBUG = 'DBG'
 
+_SEVERITY = {LOG_LEVEL.DEBUG: 10, LOG_LEVEL.INFO: 20, LOG_LEVEL.ERROR: 30}
+_LEVEL_NAMES = {'DEBUG': LOG_LEVEL.DEBUG, 'INFO': LOG_LEVEL.INFO, 'ERROR': LOG_LEVEL.ERROR}
+
+_TIMEZONE = timezone('US/Pacific')
+_min_severity = _SEVERITY[LOG_LEVEL.DEBUG]
+_event_log: str | None = None
+
 def _generate_timestamp() -> str:
     date_format = "%d-%b-%Y %H:%M:%S"
-    date = datetime.now(tz=utc)
-    date = date.astimezone(timezone('US/Pacific'))
-    return date.strftime(date_format)
+    return datetime.now(tz=_TIMEZONE).strftime(date_format)
+
+
+class _RotatingFile:
+    """Append-only log file kept open between writes.
+
+    Rolls over to `<path>.1` (shifting older backups up to `backup_count`) once it
+    grows past `max_bytes` or has been open for `max_age` seconds.
+    """
+    def __init__(self, path: str, max_bytes: int, max_age: float, backup_count: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.backup_count = backup_count
+        self._open()
+
+    def _open(self):
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._opened_at = time.monotonic()
+        self._size = self._file.tell()
+
+    def write(self, text: str):
+        if self._size >= self.max_bytes or time.monotonic() - self._opened_at >= self.max_age:
+            self._rotate()
+        self._file.write(text)
+        # Characters rather than bytes, close enough for deciding when to roll over
+        self._size += len(text)
+
+    def flush(self):
+        self._file.flush()
+
+    def _rotate(self):
+        self._file.close()
+        if self.backup_count > 0:
+            for i in range(self.backup_count - 1, 0, -1):
+                if os.path.exists(f"{self.path}.{i}"):
+                    os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._open()
+
+    def close(self):
+        self._file.close()
+
+
+class _LogWriter:
+    """Background thread writing queued log lines to their files.
+
+    Lines are written in batches with one flush per batch, so logging never blocks
+    the caller on disk I/O.
+    """
+    _STOP = object()
+
+    def __init__(self, max_bytes: int = 10 * 1024 * 1024, rotate_hours: float = 24.0, backup_count: int = 5,
+                 flush_interval: float = 0.5, batch_size: int = 512):
+        self.max_bytes = max_bytes
+        self.rotate_hours = rotate_hours
+        self.backup_count = backup_count
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._files: dict[str, _RotatingFile] = {}
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def put(self, file_name: str, line: str):
+        if self._thread is None:
+            self._start()
+        self._queue.put((file_name, line))
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+                self._thread.start()
+
+    def _file(self, file_name: str) -> _RotatingFile:
+        if (log_file := self._files.get(file_name)) is None:
+            log_file = self._files[file_name] = _RotatingFile(file_name, self.max_bytes, self.rotate_hours * 3600,
+                                                              self.backup_count)
+        return log_file
+
+    def _run(self):
+        while True:
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = False
+            touched = set()
+            for record in batch:
+                if record is self._STOP:
+                    stop = True
+                    continue
+                file_name, line = record
+                self._file(file_name).write(line)
+                touched.add(file_name)
+            for file_name in touched:
+                self._files[file_name].flush()
+            if stop:
+                break
+
+    def close(self):
+        """Writes out everything queued so far and closes the files."""
+        with self._lock:
+            if self._thread is None:
+                return
+            self._queue.put(self._STOP)
+            self._thread.join()
+            self._thread = None
+            for log_file in self._files.values():
+                log_file.close()
+            self._files = {}
+
+_writer = _LogWriter()
+atexit.register(_writer.close)
+
+def configure(level: str = 'DEBUG', max_bytes: int | None = None, rotate_hours: float | None = None,
+              backup_count: int | None = None, event_log: str | None = None):
+    """Sets the minimum level logged and how log files rotate.
+
+    Args:
+        level: one of DEBUG, INFO or ERROR; lower levels are dropped before formatting
+        max_bytes: rotate a log file once it grows past this size
+        rotate_hours: rotate a log file after it has been open this long
+        backup_count: number of rotated files kept per log
+        event_log: JSON-lines file receiving `log_json` records, None to drop them
+    """
+    global _min_severity, _event_log
+    _event_log = event_log
+    if level.upper() not in _LEVEL_NAMES:
+        raise ValueError(f"Unknown log level {level!r}, expected one of {', '.join(_LEVEL_NAMES)}")
+    _min_severity = _SEVERITY[_LEVEL_NAMES[level.upper()]]
+    _writer.close()
+    if max_bytes is not None:
+        _writer.max_bytes = max_bytes
+    if rotate_hours is not None:
+        _writer.rotate_hours = rotate_hours
+    if backup_count is not None:
+        _writer.backup_count = backup_count
+
+def log_json(record: dict):
+    """Appends `record` as one JSON line to the event log, if one is configured."""
+    if _event_log is not None:
+        _writer.put(_event_log, json.dumps(record, separators=(',', ':')) + "\n")
+
+def flush():
+    """Blocks until every line logged so far is on disk."""
+    _writer.close()
 
 def _log(log_level: str, *values: object, sep: str | None = " ", end: str | None = "\n") -> str | None:
-    print(f"[{log_level}][{_generate_timestamp()}]", *values, sep=sep, end=end)
-    log_file_name = 'debug_log.txt' if log_level == LOG_LEVEL.DEBUG else 'log.txt'
-    with open(log_file_name, 'a') as log_file:
-        print(f"[{log_level}] [{_generate_timestamp()}]", *values, sep=sep, end=end, file=log_file)
-    
+    if _SEVERITY[log_level] < _min_severity:
+        return None
+
+    timestamp = _generate_timestamp()
+    sep = " " if sep is None else sep
+    message = "".join(sep + str(value) for value in values) + ("\n" if end is None else end)
+    print(f"[{log_level}][{timestamp}]{message}", end='')
+    result = f"[{log_level}] [{timestamp}]{message}"
+    _writer.put('debug_log.txt' if log_level == LOG_LEVEL.DEBUG else 'log.txt', result)
+
     if log_level == LOG_LEVEL.ERROR:
-        from io import StringIO
-        s = StringIO()
-        print(f"[{log_level}] [{_generate_timestamp()}]", *values, sep=sep, end=end, file=s)
-        result = s.getvalue()
         return result
 
 
@@ -35,4 +202,3 @@ def info(*values: object, sep: str | None = " ", end: str | None = "\n") -> str
 
 def debug(*values: object, sep: str | None = " ", end: str | None = "\n") -> str | None:
     return _log(LOG_LEVEL.DEBUG, *values, sep=sep, end=end)
-
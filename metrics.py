@@ -0,0 +1,231 @@
+# Module for in-process counters and latency histograms, exposed in the Prometheus text format
+import asyncio
+import functools
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
+
+from logger import error, info
+
+# Upper bounds in seconds, from a cached read to a command that blew through discord's deadline
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _escape(value: object) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(label_names: tuple[str, ...], label_values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(label_names, label_values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Monotonically increasing count per combination of label values."""
+    kind = "counter"
+
+    def __init__(self, name: str, description: str, label_names: tuple[str, ...] = ()):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def get(self, *label_values) -> float:
+        return self._values.get(label_values, 0)
+
+    def items(self) -> list[tuple[tuple, float]]:
+        with self._lock:
+            return list(self._values.items())
+
+    def render(self) -> list[str]:
+        return [f"{self.name}{_format_labels(self.label_names, labels)} {value}" for labels, value in self.items()]
+
+
+class Gauge(Counter):
+    """Value that can go up and down, e.g. the latest event loop lag."""
+    kind = "gauge"
+
+    def set(self, value: float, *label_values):
+        with self._lock:
+            self._values[label_values] = value
+
+
+class Histogram:
+    """Counts observations into cumulative buckets, per combination of label values."""
+    kind = "histogram"
+
+    def __init__(self, name: str, description: str, label_names: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.buckets = buckets
+        # label values -> [count per bucket (last is +Inf), sum, count]
+        self._values: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        with self._lock:
+            if (series := self._values.get(label_values)) is None:
+                series = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def items(self) -> list[tuple[tuple, list[int], float, int]]:
+        with self._lock:
+            return [(labels, list(counts), total, count) for labels, (counts, total, count) in self._values.items()]
+
+    def quantile(self, q: float, counts: list[int]) -> float:
+        """Upper bound of the bucket holding the `q` quantile (0-1) of `counts`, inf past the last bucket."""
+        target = q * sum(counts)
+        cumulative = 0
+        for bound, bucket_count in zip((*self.buckets, float('inf')), counts):
+            cumulative += bucket_count
+            if cumulative >= target:
+                return bound
+        return float('inf')
+
+    def render(self) -> list[str]:
+        lines = []
+        for labels, counts, total, count in self.items():
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, labels, f'le="{bound}"')} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, labels)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: list[Counter | Histogram] = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Returns every metric in the Prometheus text exposition format."""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+DB_CALLS = registry.register(Counter("sockbot_db_calls_total", "Database calls run by AsyncDatabase, by function and outcome", ("function", "outcome")))
+DB_SECONDS = registry.register(Histogram("sockbot_db_call_seconds", "Database call latency on the reader or writer connection", ("function",)))
+SQLITE_BUSY = registry.register(Counter("sockbot_sqlite_busy_total", "SQLite calls that failed with database is locked/busy"))
+DB_GROUP_SIZE = registry.register(Histogram("sockbot_db_group_commit_size", "Writes committed together per group commit",
+                                             buckets=(1, 2, 4, 8, 16, 32, 64)))
+COMMANDS = registry.register(Counter("sockbot_commands_total", "Slash command invocations by outcome", ("command", "outcome")))
+COMMAND_SECONDS = registry.register(Histogram("sockbot_command_seconds", "Slash command latency", ("command",)))
+COMMAND_ACK_SECONDS = registry.register(Histogram("sockbot_command_ack_seconds", "Time from a deferred slash command's invocation to discord being acknowledged",
+                                                  ("command",), buckets=(0.1, 0.25, 0.5, 1.0, 1.5, 2.0, 2.5, 3.0)))
+MISSED_DEADLINES = registry.register(Counter("sockbot_missed_interaction_deadlines_total", "Deferred slash commands acknowledged too late for discord", ("command",)))
+STARTUP_SECONDS = registry.register(Gauge("sockbot_startup_phase_seconds", "Duration of each phase of the last startup", ("phase",)))
+LOOP_LAG = registry.register(Histogram("sockbot_event_loop_lag_seconds", "How late the event loop woke a sleeping task"))
+LOOP_LAG_LAST = registry.register(Gauge("sockbot_event_loop_lag_last_seconds", "Most recently measured event loop lag"))
+
+def _is_busy(err: sqlite3.OperationalError) -> bool:
+    message = str(err).lower()
+    return "locked" in message or "busy" in message
+
+@contextmanager
+def timed_db_call(name: str) -> Iterator[None]:
+    """Counts and times the database call `name` run in the `with` block, and SQLite busy errors raised by it."""
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    except sqlite3.OperationalError as err:
+        if _is_busy(err):
+            SQLITE_BUSY.inc()
+        raise
+    finally:
+        DB_CALLS.inc(name, outcome)
+        DB_SECONDS.observe(time.perf_counter() - start, name)
+
+def instrument_command(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """Counts and times a slash command callback. Apply below the command decorators."""
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        ctx = next((arg for arg in args if hasattr(arg, "interaction")), None)
+        name = ctx.command.qualified_name if ctx is not None and ctx.command else fn.__name__
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            result = await fn(*args, **kwargs)
+            outcome = "ok"
+            return result
+        finally:
+            COMMANDS.inc(name, outcome)
+            COMMAND_SECONDS.observe(time.perf_counter() - start, name)
+    return wrapper
+
+async def monitor_event_loop_lag(interval: float = 0.5):
+    """Sleeps `interval` seconds at a time forever, recording how much later than asked it wakes up."""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - start - interval)
+        LOOP_LAG.observe(lag)
+        LOOP_LAG_LAST.set(lag)
+
+async def start_http_server(port: int, host: str = "127.0.0.1"):
+    """Serves `registry` at http://host:port/metrics for Prometheus to scrape."""
+    from aiohttp import web
+
+    async def handle_metrics(request: web.Request) -> web.Response:
+        return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8",
+                            headers={"X-Content-Type-Options": "nosniff"})
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+    except OSError as err:
+        error(f"Could not serve metrics on {host}:{port}: {err}")
+        await runner.cleanup()
+        return None
+    info(f"Serving metrics on http://{host}:{port}/metrics")
+    return runner
+
+def _bound_ms(bound: float) -> str:
+    return f">{DEFAULT_BUCKETS[-1] * 1000:.0f}" if bound == float('inf') else f"{bound * 1000:g}"
+
+def summary(top: int = 10) -> str:
+    """Returns a short plain text digest of the busiest commands and database functions."""
+    def table(histogram: Histogram, counter: Counter, title: str) -> list[str]:
+        rows = sorted(histogram.items(), key=lambda item: item[3], reverse=True)[:top]
+        lines = [f"{title:<32}{'calls':>7}{'errors':>7}{'avg ms':>9}{'p95 ms':>9}"]
+        for labels, counts, total, count in rows:
+            lines.append(f"{labels[0]:<32}{count:>7}{int(counter.get(labels[0], 'error')):>7}"
+                         f"{total / count * 1000:>9.1f}{_bound_ms(histogram.quantile(0.95, counts)):>9}")
+        return lines
+
+    lag = LOOP_LAG.items()
+    lag_p95 = _bound_ms(LOOP_LAG.quantile(0.95, lag[0][1])) if lag else "0"
+    lines = table(COMMAND_SECONDS, COMMANDS, "command")
+    lines.append("")
+    lines.extend(table(DB_SECONDS, DB_CALLS, "database function"))
+    lines.append("")
+    lines.append(f"sqlite busy errors: {int(SQLITE_BUSY.get())}")
+    lines.append(f"missed interaction deadlines: {int(sum(value for _, value in MISSED_DEADLINES.items()))}")
+    lines.append(f"event loop lag: last {LOOP_LAG_LAST.get() * 1000:.1f} ms, p95 <= {lag_p95} ms")
+    return "\n".join(lines)
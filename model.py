@@ -22,6 +22,16 @@ class TARGET_ASSIGNMENT:
 
     def __str__(self):
         return f"{self.player_id:<20}{self.target_id:<20}"
+class TARGET_CHANGE:
+    HEADER = f"{"player_id":<20}{"old_target_id":<20}{"new_target_id"}"
+    def __init__(self, player_discord_id: str, old_target_discord_id: str | None, new_target_discord_id: str):
+        self.player_id = player_discord_id
+        self.old_target_id = old_target_discord_id
+        self.new_target_id = new_target_discord_id
+
+    def __str__(self):
+        old_target = self.old_target_id if self.old_target_id is not None else "(eliminated)"
+        return f"{self.player_id:<20}{old_target:<20}{self.new_target_id}"
 class KILL_SUMMARY:
     HEADER = f"{"player_discord_id":<20}{"Kills"}"
     def __init__(self, player_discord_id: str, kills: int):
@@ -42,3 +52,26 @@ class KILL_ENTRY:
     def __str__(self):
         return f"{self.id:<5}{self.player_discord_id.strip():<20}{self.eliminated_discord_id.strip():<20}{self.timestamp.strftime('%Y-%m-%d %H:%M:%S')}"
 
+class SNAPSHOT:
+    HEADER = f"{"kill_id":<10}{"created_at":<22}{"players":<10}{"bytes"}"
+    def __init__(self, kill_id: int, created_at: str, player_count: int, size: int):
+        self.kill_id = kill_id
+        self.created_at = created_at
+        self.player_count = player_count
+        self.size = size
+
+    def __str__(self):
+        return f"{self.kill_id:<10}{self.created_at:<22}{self.player_count:<10}{self.size}"
+
+class GAME:
+    HEADER = f"{"name":<20}{"guild_id":<22}{"kill_channel_id":<22}{"created_at":<22}{"archived_at"}"
+    def __init__(self, name: str, guild_id: int, database_path: str, kill_channel_id: int, created_at: str = "", archived_at: str | None = None):
+        self.name = name
+        self.guild_id = guild_id
+        self.database_path = database_path
+        self.kill_channel_id = kill_channel_id
+        self.created_at = created_at
+        self.archived_at = archived_at
+
+    def __str__(self):
+        return f"{self.name:<20}{self.guild_id:<22}{self.kill_channel_id:<22}{self.created_at:<22}{self.archived_at or ''}"
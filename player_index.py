@@ -0,0 +1,134 @@
+# Module holding in-memory player lookups
+import sqlite3
+
+from logger import info
+from model import PLAYER
+
+
+def normalize_secret_word(secret_word: str) -> str:
+    return secret_word.strip().lower()
+
+
+class PlayerIndex:
+    """Hash indexes over `player_info` for the sock hot path.
+
+    Keeps every player by discord id, the set of active (uneliminated) ids and a
+    normalized secret word -> player id map, so checking a sock is a couple of dict
+    lookups. Like `TargetRing`, it is only updated after the database commits.
+    """
+    def __init__(self):
+        # (players by discord id, active ids, normalized secret word -> id), replaced as a
+        # whole by `load` so the event loop never reads a half rebuilt index
+        self._index: tuple[dict[str, PLAYER], set[str], dict[str, str]] = ({}, set(), {})
+
+    @property
+    def _players(self) -> dict[str, PLAYER]:
+        return self._index[0]
+
+    @property
+    def _active(self) -> set[str]:
+        return self._index[1]
+
+    @property
+    def _by_secret_word(self) -> dict[str, str]:
+        return self._index[2]
+
+    def __len__(self) -> int:
+        return len(self._players)
+
+    def load(self, con: sqlite3.Connection):
+        """Rebuilds the index from `player_info` and `target_assignments`.
+
+        Args:
+            con: database connection
+        """
+        rows = con.execute("""
+        SELECT player_info.discord_id, player_info.player_name, player_info.group_name, player_info.secret_word,
+               target_assignments.player_discord_id IS NULL AS eliminated
+        FROM player_info
+        LEFT JOIN target_assignments ON target_assignments.player_discord_id = player_info.discord_id
+        """).fetchall()
+
+        fresh = PlayerIndex()
+        for discord_id, player_name, group_name, secret_word, eliminated in rows:
+            fresh.add_player(PLAYER(discord_id, player_name, group_name, secret_word, bool(eliminated)))
+        self._index = fresh._index
+        info(f"Loaded player index with {len(self._players)} players ({len(self._active)} active)")
+
+    def clear(self):
+        self._index = ({}, set(), {})
+
+    def add_player(self, player: PLAYER):
+        players, active, by_secret_word = self._index
+        if (previous := players.get(player.player_id)) is not None:
+            self._forget_secret_word(previous)
+        players[player.player_id] = player
+        by_secret_word[normalize_secret_word(player.secret_word)] = player.player_id
+        if player.eliminated:
+            active.discard(player.player_id)
+        else:
+            active.add(player.player_id)
+
+    def get_player(self, discord_id: str) -> PLAYER | None:
+        return self._players.get(discord_id)
+
+    def get_active_player(self, discord_id: str) -> PLAYER | None:
+        """Returns the player if they exist and have not been eliminated."""
+        players, active, _ = self._index
+        if discord_id not in active:
+            return None
+        return players.get(discord_id)
+
+    def get_active_player_by_secret_word(self, secret_word: str) -> PLAYER | None:
+        """Returns the active player with the given secret word (case-insensitive)."""
+        players, active, by_secret_word = self._index
+        if (discord_id := by_secret_word.get(normalize_secret_word(secret_word))) is None or discord_id not in active:
+            return None
+        return players.get(discord_id)
+
+    def set_eliminated(self, discord_id: str, eliminated: bool):
+        if (player := self._players.get(discord_id)) is None:
+            return
+        player.eliminated = eliminated
+        if eliminated:
+            self._active.discard(discord_id)
+        else:
+            self._active.add(discord_id)
+
+    def _forget_secret_word(self, player: PLAYER):
+        # Only if it still points at `player`, an eliminated player's word may have been handed on
+        word = normalize_secret_word(player.secret_word)
+        if self._by_secret_word.get(word) == player.player_id:
+            del self._by_secret_word[word]
+
+    def set_secret_word(self, discord_id: str, secret_word: str):
+        """Changes a player's secret word.
+
+        Raises:
+            ValueError: if another active player already has the word (ignoring case)
+        """
+        if (player := self._players.get(discord_id)) is None:
+            return
+        word = normalize_secret_word(secret_word)
+        if (owner := self._by_secret_word.get(word)) not in (None, discord_id) and owner in self._active:
+            raise ValueError(f"{owner} already has the secret word {secret_word.strip()}")
+        self._forget_secret_word(player)
+        player.secret_word = secret_word.strip()
+        self._by_secret_word[word] = discord_id
+
+    def find_problems(self, con: sqlite3.Connection) -> list[str]:
+        """Compares the index against the database.
+
+        Returns:
+            A description of every inconsistency found, empty if the index matches.
+        """
+        expected = PlayerIndex()
+        expected.load(con)
+        problems = []
+        for discord_id in expected._players.keys() ^ self._players.keys():
+            problems.append(f"{discord_id} is only in one of the player index and player_info")
+        for discord_id in expected._active ^ self._active:
+            problems.append(f"{discord_id} has a different elimination status in the player index")
+        if expected._by_secret_word != self._by_secret_word:
+            problems.append("secret word index does not match player_info")
+        return problems
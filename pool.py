@@ -0,0 +1,203 @@
+# Module to share a bounded set of long-lived SQLite connections
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from database import DATABASE_PATH, create_db_connection
+from logger import error, debug
+
+
+class ConnectionPool:
+    """A pool of reader connections and a single writer connection to one database.
+
+    Readers are opened lazily up to `max_readers` and handed out one at a time.
+    The writer is shared by every mutation so writes never contend with each other
+    inside the process.
+    """
+    def __init__(self, database_path: str = DATABASE_PATH, max_readers: int = 4, checkout_timeout: float = 10.0):
+        self.database_path = database_path
+        self.max_readers = max_readers
+        self.checkout_timeout = checkout_timeout
+
+        self._idle_readers: queue.LifoQueue[sqlite3.Connection] = queue.LifoQueue()
+        self._readers_created = 0
+        self._checked_out: set[sqlite3.Connection] = set()
+        self._closed = False
+        self._readers_lock = threading.Lock()
+
+        self._writer: sqlite3.Connection | None = None
+        self._writer_lock = threading.Lock()
+
+        self._checkouts = 0
+        self._replaced = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._stats_lock = threading.Lock()
+
+    def _open_reader(self) -> sqlite3.Connection:
+        return create_db_connection("DEFERRED", 5.0, self.database_path)
+
+    def _open_writer(self) -> sqlite3.Connection:
+        return create_db_connection("IMMEDIATE", 30.0, self.database_path)
+
+    def _is_healthy(self, con: sqlite3.Connection) -> bool:
+        try:
+            con.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error as err:
+            error(f"Discarding unhealthy connection to {self.database_path}: {err}")
+            return False
+
+    def _record_wait(self, waited: float):
+        with self._stats_lock:
+            self._checkouts += 1
+            self._total_wait += waited
+            self._max_wait = max(self._max_wait, waited)
+
+    def _check_open(self):
+        if self._closed:
+            raise RuntimeError(f"Connection pool for {self.database_path} is closed")
+
+    def _acquire_reader(self) -> sqlite3.Connection:
+        self._check_open()
+        try:
+            return self._idle_readers.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._readers_lock:
+            if self._readers_created < self.max_readers:
+                self._readers_created += 1
+                debug(f"Opening reader connection {self._readers_created}/{self.max_readers}")
+                try:
+                    return self._open_reader()
+                except sqlite3.Error:
+                    self._readers_created -= 1
+                    raise
+
+        try:
+            return self._idle_readers.get(timeout=self.checkout_timeout)
+        except queue.Empty:
+            raise TimeoutError(f"No reader connection available after {self.checkout_timeout}s")
+
+    def open_readers(self) -> int:
+        """Opens every reader connection not yet open, so the first commands after startup don't pay for it.
+
+        Returns:
+            the number of connections opened
+        """
+        opened = []
+        try:
+            with self._readers_lock:
+                self._check_open()
+                while self._readers_created < self.max_readers:
+                    con = self._open_reader()
+                    try:
+                        # Parses the schema, which each connection otherwise does on its first query
+                        con.execute("SELECT count(*) FROM sqlite_schema").fetchone()
+                    except sqlite3.Error:
+                        con.close()
+                        raise
+                    self._readers_created += 1
+                    opened.append(con)
+        finally:
+            for con in opened:
+                self._idle_readers.put(con)
+        debug(f"Opened {len(opened)} reader connections to {self.database_path}")
+        return len(opened)
+
+    @contextmanager
+    def reader(self) -> Iterator[sqlite3.Connection]:
+        """Checks out a reader connection for the duration of the `with` block."""
+        start = time.perf_counter()
+        con = self._acquire_reader()
+        if not self._is_healthy(con):
+            con.close()
+            con = self._open_reader()
+            with self._stats_lock:
+                self._replaced += 1
+        self._record_wait(time.perf_counter() - start)
+        with self._readers_lock:
+            self._checked_out.add(con)
+
+        try:
+            yield con
+        finally:
+            if con.in_transaction:
+                con.rollback()
+            with self._readers_lock:
+                self._checked_out.discard(con)
+                if self._closed:
+                    # `close` already emptied the pool, so nothing else will close it
+                    con.close()
+                    self._readers_created -= 1
+                else:
+                    self._idle_readers.put(con)
+
+    @contextmanager
+    def writer(self) -> Iterator[sqlite3.Connection]:
+        """Checks out the writer connection for the duration of the `with` block.
+
+        Any transaction left open by the caller is rolled back on release.
+        """
+        start = time.perf_counter()
+        if not self._writer_lock.acquire(timeout=self.checkout_timeout):
+            raise TimeoutError(f"Writer connection not available after {self.checkout_timeout}s")
+        try:
+            self._check_open()
+            if self._writer is None:
+                self._writer = self._open_writer()
+            elif not self._is_healthy(self._writer):
+                self._writer.close()
+                self._writer = self._open_writer()
+                with self._stats_lock:
+                    self._replaced += 1
+            self._record_wait(time.perf_counter() - start)
+
+            try:
+                yield self._writer
+            finally:
+                if self._writer.in_transaction:
+                    self._writer.rollback()
+        finally:
+            self._writer_lock.release()
+
+    def stats(self) -> dict[str, float]:
+        """Returns pool size and checkout wait-time statistics."""
+        with self._stats_lock:
+            return {
+                "max_readers": self.max_readers,
+                "readers_open": self._readers_created,
+                "readers_idle": self._idle_readers.qsize(),
+                "readers_checked_out": len(self._checked_out),
+                "writer_open": int(self._writer is not None),
+                "checkouts": self._checkouts,
+                "connections_replaced": self._replaced,
+                "avg_wait_ms": 1000 * self._total_wait / self._checkouts if self._checkouts else 0.0,
+                "max_wait_ms": 1000 * self._max_wait,
+            }
+
+    def close(self):
+        """Closes every connection of the pool and refuses further checkouts.
+
+        Idle readers are closed right away and checked-out readers when they are released.
+        The writer is closed once whoever has it checked out releases it.
+        """
+        with self._readers_lock:
+            self._closed = True
+            while True:
+                try:
+                    self._idle_readers.get_nowait().close()
+                except queue.Empty:
+                    break
+                self._readers_created -= 1
+        with self._writer_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+
+db_pool = ConnectionPool()
@@ -0,0 +1,60 @@
+# Module to cache rendered command responses between game state changes
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable
+
+
+class ResponseCache:
+    """LRU cache of stat command results keyed by command, arguments and page.
+
+    Each entry remembers the game state version it was rendered at and is treated as
+    a miss once its game's version has moved on (see `AsyncDatabase.state_version`).
+    """
+    def __init__(self, max_entries: int = 128):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[Hashable, tuple[int, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, version: int) -> Any | None:
+        """Returns the cached value for `key` if it was stored at game state `version`, otherwise None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, version: int, value: Any):
+        """Stores a value built from data read at game state `version`.
+
+        Read the version *before* querying, so a mutation that lands mid-render
+        leaves the entry already stale.
+        """
+        with self._lock:
+            self._entries[key] = (version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+response_cache = ResponseCache()
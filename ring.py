@@ -0,0 +1,145 @@
+# Module holding the in-memory target cycle
+import sqlite3
+from typing import Iterator
+
+from logger import info
+
+
+class _Node:
+    __slots__ = ("player_id", "target", "hunter")
+
+    def __init__(self, player_id: str):
+        self.player_id = player_id
+        self.target: _Node = self
+        self.hunter: _Node = self
+
+
+class TargetRing:
+    """The game's target assignments as a doubly linked cycle.
+
+    Every active player is a node pointing forward to their target and backward to
+    their hunter, so lookups and eliminations are O(1). The ring never touches the
+    database on its own: callers in `database.py` commit a change to
+    `target_assignments` first and then apply the same change here.
+    """
+    def __init__(self):
+        self._nodes: dict[str, _Node] = {}
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def __contains__(self, player_id: str) -> bool:
+        return player_id in self._nodes
+
+    def __iter__(self) -> Iterator[tuple[str, str]]:
+        for node in self._nodes.values():
+            yield node.player_id, node.target.player_id
+
+    def load(self, con: sqlite3.Connection):
+        """Rebuilds the ring from `target_assignments`.
+
+        Args:
+            con: database connection
+        """
+        rows = con.execute("SELECT player_discord_id, target_discord_id FROM target_assignments").fetchall()
+        self.load_assignments(rows)
+        info(f"Loaded target ring with {len(self._nodes)} players")
+
+    def load_assignments(self, assignments: list[tuple[str, str]]):
+        """Rebuilds the ring from (player id, target id) pairs.
+
+        Raises:
+            ValueError: if a target is not also a player in `assignments`
+        """
+        nodes = {player_id: _Node(player_id) for player_id, _ in assignments}
+        for player_id, target_id in assignments:
+            if target_id not in nodes:
+                raise ValueError(f"{player_id}'s target {target_id} has no target assignment")
+            node, target = nodes[player_id], nodes[target_id]
+            node.target = target
+            target.hunter = node
+        self._nodes = nodes
+
+    def clear(self):
+        self._nodes = {}
+
+    def get_target(self, player_id: str) -> str | None:
+        """Returns the player's target id or None if they are not in the ring."""
+        if (node := self._nodes.get(player_id)) is None:
+            return None
+        return node.target.player_id
+
+    def get_hunter(self, player_id: str) -> str | None:
+        """Returns the id of the player targeting `player_id` or None if they are not in the ring."""
+        if (node := self._nodes.get(player_id)) is None:
+            return None
+        return node.hunter.player_id
+
+    def eliminate(self, player_id: str) -> tuple[str, str] | None:
+        """Splices a player out of the ring, their hunter inherits their target.
+
+        Returns:
+            (hunter id, hunter's new target id) or None if the player is not in the ring
+        """
+        if (node := self._nodes.pop(player_id, None)) is None:
+            return None
+        hunter, target = node.hunter, node.target
+        if hunter is node:
+            # Last player standing
+            return player_id, player_id
+        hunter.target = target
+        target.hunter = hunter
+        return hunter.player_id, target.player_id
+
+    def revive(self, player_id: str, hunter_id: str):
+        """Inserts a player back between `hunter_id` and the hunter's current target.
+
+        Raises:
+            KeyError: if the hunter is not in the ring
+            ValueError: if the player is already in the ring
+        """
+        if player_id in self._nodes:
+            raise ValueError(f"{player_id} is already in the target ring")
+        node = _Node(player_id)
+        if player_id != hunter_id:
+            hunter = self._nodes[hunter_id]
+            node.target = hunter.target
+            node.hunter = hunter
+            hunter.target.hunter = node
+            hunter.target = node
+        self._nodes[player_id] = node
+
+    def find_problems(self, con: sqlite3.Connection) -> list[str]:
+        """Compares the ring against `target_assignments` and checks it is one cycle.
+
+        Args:
+            con: database connection
+
+        Returns:
+            A description of every inconsistency found, empty if the ring matches.
+        """
+        problems = []
+        table = dict(con.execute("SELECT player_discord_id, target_discord_id FROM target_assignments").fetchall())
+        ring = dict(self)
+
+        for player_id in table.keys() - ring.keys():
+            problems.append(f"{player_id} is assigned a target in the database but is not in the ring")
+        for player_id in ring.keys() - table.keys():
+            problems.append(f"{player_id} is in the ring but has no target in the database")
+        for player_id in table.keys() & ring.keys():
+            if table[player_id] != ring[player_id]:
+                problems.append(f"{player_id} targets {table[player_id]} in the database but {ring[player_id]} in the ring")
+
+        for node in self._nodes.values():
+            if node.target.hunter is not node:
+                problems.append(f"{node.player_id}'s target {node.target.player_id} does not point back to them")
+
+        if self._nodes:
+            start = next(iter(self._nodes.values()))
+            node, length = start.target, 1
+            while node is not start and length <= len(self._nodes):
+                node, length = node.target, length + 1
+            if length != len(self._nodes):
+                problems.append(f"ring is not a single cycle ({length} of {len(self._nodes)} players reachable)")
+
+        return problems
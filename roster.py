@@ -0,0 +1,179 @@
+# Module for reading and validating the starting roster CSV, and assigning targets for rosters without them
+import csv
+import heapq
+import random
+from typing import Iterator
+
+# Discord ID, Name, Group, Target_discord_id, Secret Word
+ROSTER_COLUMNS = 5
+# Discord ID, Name, Group, Secret Word, for rosters whose targets `generate_target_cycle` assigns
+BARE_ROSTER_COLUMNS = 4
+INGEST_BATCH_SIZE = 1000
+
+
+class RosterError(ValueError):
+    """Raised when a roster CSV can't be ingested, `problems` lists everything wrong with it."""
+    def __init__(self, problems: list[str]):
+        self.problems = problems
+        super().__init__(f"{len(problems)} problem(s) in roster: " + "; ".join(problems[:5]))
+
+
+class RosterValidator:
+    """Checks roster rows as they stream past, then the target assignments as a whole.
+
+    Only the player -> target mapping is kept in memory, which the cycle check needs
+    anyway. Problems are collected rather than raised so one pass reports all of them.
+    """
+    def __init__(self):
+        self.problems: list[str] = []
+        self._targets: dict[str, str] = {}
+        self._lines: dict[str, int] = {}
+        self._secret_words: dict[str, int] = {}
+
+    def check_row(self, line: int, row: list[str]) -> bool:
+        """Records `row` (from `line` of the file) and returns whether it can be inserted."""
+        if len(row) != ROSTER_COLUMNS:
+            self.problems.append(f"line {line}: expected {ROSTER_COLUMNS} columns, got {len(row)}")
+            return False
+        discord_id, _, _, target_id, secret_word = row
+        valid = True
+        for column, value in (("Discord ID", discord_id), ("Target_discord_id", target_id), ("Secret Word", secret_word)):
+            if not value:
+                self.problems.append(f"line {line}: {column} is empty")
+                valid = False
+        if discord_id and (first := self._lines.get(discord_id)) is not None:
+            self.problems.append(f"line {line}: duplicate Discord ID {discord_id} (first on line {first})")
+            valid = False
+        # Secret words are matched case-insensitively by /sock
+        if secret_word and (first := self._secret_words.get(secret_word.lower())) is not None:
+            self.problems.append(f"line {line}: {discord_id}'s secret word is already used on line {first}")
+            valid = False
+        if not valid:
+            return False
+        self._lines[discord_id] = line
+        self._secret_words[secret_word.lower()] = line
+        self._targets[discord_id] = target_id
+        return True
+
+    def finish(self) -> list[str]:
+        """Checks that the targets form exactly one cycle through every player.
+
+        Returns:
+            every problem found in the roster
+        """
+        if not self._targets:
+            if not self.problems:
+                self.problems.append("roster has no players")
+            return self.problems
+
+        hunters: dict[str, str] = {}
+        broken = False
+        for player_id, target_id in self._targets.items():
+            if target_id not in self._targets:
+                self.problems.append(f"line {self._lines[player_id]}: {player_id}'s target {target_id} is not a player")
+                broken = True
+            elif (hunter_id := hunters.setdefault(target_id, player_id)) != player_id:
+                self.problems.append(f"line {self._lines[player_id]}: {target_id} is targeted by both {hunter_id} and {player_id}")
+                broken = True
+        # Without a target per player and one hunter per target, the targets aren't a permutation to walk
+        if broken:
+            return self.problems
+
+        cycles = []
+        visited: set[str] = set()
+        for start in self._targets:
+            if start in visited:
+                continue
+            length = 0
+            player_id = start
+            while player_id not in visited:
+                visited.add(player_id)
+                length += 1
+                player_id = self._targets[player_id]
+            cycles.append((start, length))
+        if len(cycles) > 1:
+            details = ", ".join(f"{length} players from {start}" for start, length in cycles[:5])
+            more = f" and {len(cycles) - 5} more" if len(cycles) > 5 else ""
+            self.problems.append(f"targets form {len(cycles)} separate cycles instead of one: {details}{more}")
+        return self.problems
+
+
+def read_roster(filename: str) -> Iterator[tuple[int, list[str]]]:
+    """Streams (line number, stripped row) from a roster CSV, skipping the header row.
+
+    Args:
+        filename: filepath to csv data.
+
+    Raises:
+        OSError: if file does not exist.
+    """
+    with open(filename, 'r', newline='', encoding='utf-8-sig') as csvfile:
+        reader = csv.reader(csvfile, delimiter=',')
+        next(reader, None)
+        for row in reader:
+            # Spreadsheet exports often end with blank lines
+            if not any(cell.strip() for cell in row):
+                continue
+            yield reader.line_num, [cell.strip() for cell in row]
+
+
+def group_key(player_id: str, group_name: str) -> str:
+    """Returns what players are compared by to keep groups apart. Players without a group are only kept apart from themselves."""
+    group = group_name.strip().lower()
+    return group if group else f"\0{player_id}"
+
+
+def generate_target_cycle(players: list[tuple[str, str]], avoid_same_group: bool = True,
+                          rng: random.Random | None = None) -> list[str]:
+    """Orders (discord id, group name) players into a random target cycle, each targeting the next and the last the first.
+
+    With `avoid_same_group` the players are dealt out greedily: every position takes a
+    random member of the group with the most players left that isn't the previous
+    player's group. That never puts two of a group next to each other unless one group
+    holds more than half the players, and takes O(n log g) for g groups instead of
+    reshuffling until a valid cycle turns up.
+
+    Args:
+        players: (discord id, group name) of every player
+        avoid_same_group: keep players from targeting their own group wherever possible
+        rng: source of randomness, e.g. a seeded `random.Random` for reproducible games
+
+    Returns:
+        discord ids in target order
+    """
+    rng = rng or random.Random()
+    if not avoid_same_group or len(players) < 3:
+        order = [player_id for player_id, _ in players]
+        rng.shuffle(order)
+        return order
+
+    groups: dict[str, list[str]] = {}
+    for player_id, group_name in players:
+        groups.setdefault(group_key(player_id, group_name), []).append(player_id)
+    for members in groups.values():
+        rng.shuffle(members)
+
+    # (-players left, random tie break, group) so equally sized groups take turns in a random order
+    heap = [(-len(members), rng.random(), key) for key, members in groups.items()]
+    heapq.heapify(heap)
+    order: list[str] = []
+    order_groups: list[str] = []
+    while heap:
+        left, tie_break, key = heapq.heappop(heap)
+        if order_groups and key == order_groups[-1] and heap:
+            deferred = (left, tie_break, key)
+            left, tie_break, key = heapq.heappop(heap)
+            heapq.heappush(heap, deferred)
+        order.append(groups[key].pop())
+        order_groups.append(key)
+        if left + 1 < 0:
+            heapq.heappush(heap, (left + 1, rng.random(), key))
+
+    # The last player targets the first, move the last between two players of other groups if they clash
+    last_group = order_groups[-1]
+    if order_groups[0] == last_group:
+        for i in range(len(order) - 2):
+            if order_groups[i] != last_group and order_groups[i + 1] != last_group:
+                order.insert(i + 1, order.pop())
+                break
+    return order
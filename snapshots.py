@@ -0,0 +1,174 @@
+# Module to snapshot and restore target assignments by kill ID
+import itertools
+import json
+import sqlite3
+import zlib
+
+from model import SNAPSHOT
+
+# A snapshot of target_assignments is stored every SNAPSHOT_INTERVAL kills
+SNAPSHOT_INTERVAL = 50
+
+# (kill id, player discord id, eliminated discord id, hunter discord id)
+KillRow = tuple[int, str, str, str]
+
+def _encode_assignments(assignments: dict[str, str]) -> bytes:
+    return zlib.compress(json.dumps(list(assignments.items()), separators=(',', ':')).encode())
+
+def _decode_assignments(blob: bytes) -> dict[str, str]:
+    return dict(json.loads(zlib.decompress(blob)))
+
+def take_snapshot(con: sqlite3.Connection, kill_id: int | None = None) -> int:
+    """Stores a compressed copy of `target_assignments` as of `kill_id`.
+
+    Runs inside the caller's transaction, the caller commits.
+
+    Args:
+        con: database connection
+        kill_id: the last kill reflected in target_assignments, defaults to the latest kill
+
+    Returns:
+        the kill id the snapshot was recorded at
+    """
+    cur = con.cursor()
+    if kill_id is None:
+        kill_id = cur.execute("SELECT COALESCE(MAX(id), 0) FROM kill_log").fetchone()[0]
+    assignments = dict(cur.execute("SELECT player_discord_id, target_discord_id FROM target_assignments").fetchall())
+    cur.execute("""
+    INSERT OR REPLACE INTO game_snapshots (kill_id, player_count, assignments) VALUES (?, ?, ?)
+    """, (kill_id, len(assignments), _encode_assignments(assignments)))
+    return kill_id
+
+def delete_snapshots_after(con: sqlite3.Connection, kill_id: int):
+    """Removes snapshots of kills after `kill_id`, e.g. once those kills are undone."""
+    con.execute("DELETE FROM game_snapshots WHERE kill_id > ?", (kill_id,))
+
+def get_snapshots(con: sqlite3.Connection) -> list[SNAPSHOT]:
+    """Returns a list of all stored snapshots, oldest first.
+
+    Args:
+        con: database connection
+    """
+    res = con.execute("""
+    SELECT kill_id, datetime(created_at, 'localtime'), player_count, length(assignments)
+    FROM game_snapshots
+    ORDER BY kill_id
+    """)
+    return [SNAPSHOT(*row) for row in res.fetchall()]
+
+def undo_kills(assignments: dict[str, str], kills: list[KillRow]):
+    """Undoes `kills` (newest first) on `assignments` in place."""
+    for _, _, eliminated_discord_id, hunter_discord_id in kills:
+        assignments[eliminated_discord_id] = assignments[hunter_discord_id]
+        assignments[hunter_discord_id] = eliminated_discord_id
+
+def replay_kills(assignments: dict[str, str], kills: list[KillRow]):
+    """Applies `kills` (oldest first) to `assignments` in place."""
+    for _, _, eliminated_discord_id, hunter_discord_id in kills:
+        assignments[hunter_discord_id] = assignments.pop(eliminated_discord_id)
+
+def _get_kills(cur: sqlite3.Cursor, after_id: int, up_to_id: int | None, newest_first: bool) -> list[KillRow]:
+    sql = """
+    SELECT id, player_discord_id, target_discord_id, COALESCE(hunter_discord_id, player_discord_id)
+    FROM kill_log
+    WHERE id > ?
+    """
+    params: tuple = (after_id,)
+    if up_to_id is not None:
+        sql += " AND id <= ?"
+        params += (up_to_id,)
+    sql += " ORDER BY id DESC" if newest_first else " ORDER BY id ASC"
+    return cur.execute(sql, params).fetchall()
+
+def _count_kills(cur: sqlite3.Cursor, after_id: int, up_to_id: int) -> int:
+    return cur.execute("SELECT COUNT(*) FROM kill_log WHERE id > ? AND id <= ?", (after_id, up_to_id)).fetchone()[0]
+
+def assignments_at_kill(con: sqlite3.Connection, kill_id: int) -> tuple[dict[str, str], list[KillRow] | None]:
+    """Reconstructs `target_assignments` as it was right after `kill_id`.
+
+    Starts from whichever is closest (in kills to apply) to `kill_id`: the current
+    assignments, the nearest snapshot after it, or the nearest snapshot before it, and
+    undoes or replays only the kills in between.
+
+    Args:
+        con: database connection
+        kill_id: the kill ID to reconstruct
+
+    Returns:
+        the assignments, and the kills undone (newest first) if the current
+        assignments were used as the starting point, otherwise None
+    """
+    cur = con.cursor()
+    latest_kill_id = cur.execute("SELECT COALESCE(MAX(id), 0) FROM kill_log").fetchone()[0]
+    candidates = [(_count_kills(cur, kill_id, latest_kill_id), "current", None)]
+
+    above = cur.execute("SELECT kill_id FROM game_snapshots WHERE kill_id >= ? ORDER BY kill_id LIMIT 1", (kill_id,)).fetchone()
+    if above is not None:
+        candidates.append((_count_kills(cur, kill_id, above[0]), "above", above[0]))
+    below = cur.execute("SELECT kill_id FROM game_snapshots WHERE kill_id <= ? ORDER BY kill_id DESC LIMIT 1", (kill_id,)).fetchone()
+    if below is not None:
+        candidates.append((_count_kills(cur, below[0], kill_id), "below", below[0]))
+
+    _, source, snapshot_kill_id = min(candidates, key=lambda candidate: candidate[0])
+    if source == "current":
+        assignments = dict(cur.execute("SELECT player_discord_id, target_discord_id FROM target_assignments").fetchall())
+        kills = _get_kills(cur, kill_id, None, newest_first=True)
+        undo_kills(assignments, kills)
+        return assignments, kills
+
+    blob = cur.execute("SELECT assignments FROM game_snapshots WHERE kill_id = ?", (snapshot_kill_id,)).fetchone()[0]
+    assignments = _decode_assignments(blob)
+    if source == "above":
+        undo_kills(assignments, _get_kills(cur, kill_id, snapshot_kill_id, newest_first=True))
+    else:
+        replay_kills(assignments, _get_kills(cur, snapshot_kill_id, kill_id, newest_first=False))
+    return assignments, None
+
+def _undo_from_current(cur: sqlite3.Cursor, kills: list[KillRow]) -> tuple[dict[str, str], dict[str, str]]:
+    """Undoes `kills` (newest first) on only the assignments they touch, read from `target_assignments`.
+
+    Returns:
+        those assignments before and after the undo
+    """
+    players = list({player for _, _, eliminated, hunter in kills for player in (eliminated, hunter)})
+    before: dict[str, str] = {}
+    for chunk in itertools.batched(players, 500):
+        before.update(cur.execute(f"""
+        SELECT player_discord_id, target_discord_id FROM target_assignments
+        WHERE player_discord_id IN ({','.join('?' * len(chunk))})
+        """, chunk).fetchall())
+    # Hunters undone here are either still alive or revived by a newer kill earlier in `kills`
+    after = dict(before)
+    undo_kills(after, kills)
+    return before, after
+
+def assignment_changes_since(con: sqlite3.Connection, kill_id: int) -> list[tuple[str, str | None, str]]:
+    """Lists the assignments that differ between now and right after `kill_id`.
+
+    Undoing from the current assignments only touches two rows per kill, so a snapshot
+    is used only when decoding its every player costs less than the kills to undo.
+
+    Args:
+        con: database connection
+        kill_id: the kill ID to compare against
+
+    Returns:
+        (player id, current target or None if eliminated, target as of `kill_id`) of every changed assignment
+    """
+    cur = con.cursor()
+    latest_kill_id = cur.execute("SELECT COALESCE(MAX(id), 0) FROM kill_log").fetchone()[0]
+    undo_count = _count_kills(cur, kill_id, latest_kill_id)
+    snapshot_costs = [player_count + _count_kills(cur, *sorted((kill_id, snapshot_kill_id)))
+                      for snapshot_kill_id, player_count in cur.execute("""
+                      SELECT kill_id, player_count FROM game_snapshots WHERE kill_id = (SELECT MIN(kill_id) FROM game_snapshots WHERE kill_id >= ?)
+                      UNION ALL
+                      SELECT kill_id, player_count FROM game_snapshots WHERE kill_id = (SELECT MAX(kill_id) FROM game_snapshots WHERE kill_id <= ?)
+                      """, (kill_id, kill_id)).fetchall()]
+
+    if not snapshot_costs or undo_count <= min(snapshot_costs):
+        before, after = _undo_from_current(cur, _get_kills(cur, kill_id, None, newest_first=True))
+    else:
+        before = dict(cur.execute("SELECT player_discord_id, target_discord_id FROM target_assignments").fetchall())
+        after, _ = assignments_at_kill(con, kill_id)
+    return [(player_id, before.get(player_id), target_id) for player_id, target_id in after.items() if before.get(player_id) != target_id]
+
@@ -0,0 +1,49 @@
+# Module timing the phases of bot startup
+import time
+from typing import Awaitable, TypeVar
+
+from logger import debug
+from metrics import STARTUP_SECONDS
+
+T = TypeVar("T")
+
+
+class StartupTimer:
+    """Records how long each startup phase took and summarizes them once the bot is ready.
+
+    Sequential phases are recorded with `mark`, each lasting from the previous mark (or
+    `started`). Phases running alongside them, like the state warm-up during the gateway
+    connect, are recorded with `timed`.
+    """
+    def __init__(self, started: float | None = None):
+        self.started = started if started is not None else time.perf_counter()
+        self._last_mark = self.started
+        self.phases: list[tuple[str, float]] = []
+        self.parallel_phases: list[tuple[str, float]] = []
+
+    def _record(self, phases: list[tuple[str, float]], name: str, seconds: float):
+        phases.append((name, seconds))
+        STARTUP_SECONDS.set(seconds, name)
+        debug(f"Startup phase {name} took {seconds * 1000:.0f} ms")
+
+    def mark(self, name: str):
+        """Ends the sequential phase `name` now."""
+        now = time.perf_counter()
+        self._record(self.phases, name, now - self._last_mark)
+        self._last_mark = now
+
+    async def timed(self, name: str, awaitable: Awaitable[T]) -> T:
+        """Awaits `awaitable`, recording it as the parallel phase `name`."""
+        start = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            self._record(self.parallel_phases, name, time.perf_counter() - start)
+
+    def report(self) -> str:
+        """Returns a one line summary of every phase recorded so far."""
+        phases = ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in self.phases)
+        summary = f"Ready {self._last_mark - self.started:.2f}s after start: {phases}"
+        if self.parallel_phases:
+            summary += " (alongside: " + ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in self.parallel_phases) + ")"
+        return summary
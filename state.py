@@ -0,0 +1,55 @@
+# Module holding the in-process copy of the game state
+import sqlite3
+
+from leaderboard import Leaderboard
+from player_index import PlayerIndex
+from ring import TargetRing
+
+
+class GameState:
+    """In-memory structures kept in step with one game database.
+
+    Mutating functions in `database.py` take an optional `state` and call the
+    `record_*` hooks once their transaction, or their SAVEPOINT inside a group commit,
+    has been released. Within a group that is before the group's COMMIT, so that later
+    writes in the group see earlier ones. Commands on the event loop can meanwhile read
+    changes that are not yet durable, and if the COMMIT fails `AsyncDatabase` reloads the
+    state, dropping them again. Callers of the write itself only hear back after the COMMIT.
+    """
+    def __init__(self):
+        self.ring = TargetRing()
+        self.players = PlayerIndex()
+        self.leaderboard = Leaderboard()
+
+    def load(self, con: sqlite3.Connection):
+        """(Re)loads every structure from the database."""
+        self.ring.load(con)
+        self.players.load(con)
+        self.leaderboard.load(con)
+
+    def clear(self):
+        self.ring.clear()
+        self.players.clear()
+        self.leaderboard.clear()
+
+    def record_elimination(self, kill_id: int, hunter_id: str, eliminated_id: str, killer_id: str):
+        self.ring.eliminate(eliminated_id)
+        self.players.set_eliminated(eliminated_id, True)
+        self.leaderboard.add_kill(killer_id, kill_id)
+        self.leaderboard.set_eliminated(eliminated_id, True)
+
+    def record_undo(self, kill_id: int, hunter_id: str, eliminated_id: str, killer_id: str):
+        self.ring.revive(eliminated_id, hunter_id)
+        self.players.set_eliminated(eliminated_id, False)
+        self.leaderboard.remove_kill(killer_id, kill_id)
+        self.leaderboard.set_eliminated(eliminated_id, False)
+
+    def record_secret_word(self, player_id: str, secret_word: str):
+        self.players.set_secret_word(player_id, secret_word)
+
+    def find_problems(self, con: sqlite3.Connection) -> list[str]:
+        """Returns every inconsistency between the in-memory state and the database."""
+        return self.ring.find_problems(con) + self.players.find_problems(con) + self.leaderboard.find_problems(con)
+
+
+game_state = GameState()